@@ -1,3 +1,4 @@
+import asyncio
 import httpx
 from datetime import datetime
 from typing import List, Dict, Optional
@@ -6,6 +7,22 @@ from sqlalchemy import select, and_, or_
 from src.db.models import CalendarEvent, UserAvailability, EventStatus
 import json
 from src.services.rabbitmq import publish_event
+from src.services.http_client import register_upstream, CircuitOpenError
+from src.config import (
+    TEAM_SERVICE_URL, HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_HEDGE_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+
+team_service = register_upstream(
+    "team-service",
+    TEAM_SERVICE_URL,
+    timeout=HTTP_TIMEOUT,
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_RESET_TIMEOUT,
+    hedge_delay=HTTP_HEDGE_DELAY
+)
 
 
 async def validate_participants_availability(
@@ -198,14 +215,14 @@ async def check_user_permissions(
         org_unit_id: Optional[int] = None
 ) -> bool:
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"http://team-service:8002/api/org_members/{organizer_id}/hierarchy"
-            )
-            if response.status_code == 200:
-                hierarchy = response.json()
-                return True
-    except Exception:
+        response = await team_service.get(
+            f"/api/org_members/{organizer_id}/hierarchy",
+            hedge=True
+        )
+        if response.status_code == 200:
+            hierarchy = response.json()
+            return True
+    except (httpx.HTTPError, asyncio.TimeoutError, CircuitOpenError):
         pass
 
     return True
@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, and_, or_, func
+from sqlalchemy import select, update, and_, or_, func, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 from src.db.database import get_db
 from src.db.models import CalendarEvent, UserAvailability, TimeSlot, EventType, EventStatus
 from src.api.schemas import (
     CalendarEventCreate, CalendarEventUpdate, CalendarEventOut,
     UserAvailabilityCreate, UserAvailabilityUpdate, UserAvailabilityOut,
-    TimeSlotCreate, TimeSlotOut, AvailabilityCheck, AvailabilityResponse)
+    TimeSlotCreate, TimeSlotOut, AvailabilityCheck, AvailabilityResponse,
+    BatchGetRequest, CalendarEventBatchOut)
 from src.api.calendar_utils import (
     validate_participants_availability, create_meeting_with_validation,
     check_user_permissions, notify_participants)
 from src.services.rabbitmq import publish_event
+from src.services.http_client import upstream_metrics
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 import json
@@ -18,6 +21,11 @@ import json
 router = APIRouter()
 
 
+@router.get("/metrics")
+async def get_metrics():
+    return {"upstreams": upstream_metrics()}
+
+
 @router.post("/events", response_model=CalendarEventOut)
 async def create_event(payload: CalendarEventCreate, db: AsyncSession = Depends(get_db)):
     if payload.start_at >= payload.end_at:
@@ -147,6 +155,21 @@ async def get_events(
     return events
 
 
+@router.post("/events:batchGet", response_model=CalendarEventBatchOut)
+async def batch_get_events(payload: BatchGetRequest, db: AsyncSession = Depends(get_db)):
+    ids = list(dict.fromkeys(payload.ids))
+    res = await db.execute(
+        select(CalendarEvent).where(CalendarEvent.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
+    )
+    found = {event.id: event for event in res.scalars().all()}
+
+    batch = CalendarEventBatchOut(
+        items=[found[i] for i in ids if i in found],
+        missing=[i for i in ids if i not in found]
+    )
+    return Response(content=batch.model_dump_json(), media_type="application/json")
+
+
 @router.get("/events/{event_id}", response_model=CalendarEventOut)
 async def get_event(event_id: int, db: AsyncSession = Depends(get_db)):
     """Получение события по ID"""
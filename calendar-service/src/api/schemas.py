@@ -1,7 +1,8 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
 from datetime import datetime, date
 from src.db.models import EventType, EventStatus
+from src.config import BATCH_GET_MAX_IDS
 
 
 class CalendarEventCreate(BaseModel):
@@ -132,3 +133,12 @@ class CalendarView(BaseModel):
     end_date: date
     include_team_events: bool = False
     team_id: Optional[int] = None
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+
+class CalendarEventBatchOut(BaseModel):
+    items: List[CalendarEventOut]
+    missing: List[int]
@@ -5,6 +5,7 @@ from src.db.database import engine
 from src.db.models import CalendarEvent, UserAvailability, TimeSlot
 from sqladmin import Admin, ModelView
 from src.services.event_consumers import setup_calendar_consumers
+from src.services.http_client import close_upstreams
 
 app = FastAPI(title="Calendar Service", version="1.0.0")
 app.include_router(router, prefix="/api")
@@ -16,6 +17,11 @@ async def startup_event():
     asyncio.create_task(setup_calendar_consumers())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_upstreams()
+
+
 class CalendarEventAdmin(ModelView, model=CalendarEvent):
     column_list = [
         CalendarEvent.id, CalendarEvent.title, CalendarEvent.description,
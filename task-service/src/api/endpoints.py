@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_
+from sqlalchemy import select, update, delete, and_, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 from src.api.utils import update_user_performance, calculate_average_metrics
 from src.api.task_utils import update_task_status, validate_task_assignment, calculate_task_metrics
 from src.api.evaluation_utils import create_task_evaluation, get_user_evaluation_matrix, get_team_average_scores, \
@@ -8,7 +9,7 @@ from src.api.evaluation_utils import create_task_evaluation, get_user_evaluation
 from src.db.database import get_db
 from src.db.models import Task, TaskComment, TaskEvaluation, UserPerformance
 from src.api.schemas import TaskCreate, TaskUpdate, TaskOut, CommentCreate, EvaluationCreate, UserPerformanceOut, \
-    EvaluationOut
+    EvaluationOut, BatchGetRequest, TaskBatchOut
 from src.services.rabbitmq import publish_event
 from typing import Optional
 from datetime import datetime, date
@@ -45,6 +46,21 @@ async def create_task(payload: TaskCreate, db: AsyncSession = Depends(get_db)):
     return task
 
 
+@router.post("/tasks:batchGet", response_model=TaskBatchOut)
+async def batch_get_tasks(payload: BatchGetRequest, db: AsyncSession = Depends(get_db)):
+    ids = list(dict.fromkeys(payload.ids))
+    res = await db.execute(
+        select(Task).where(Task.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
+    )
+    found = {task.id: task for task in res.scalars().all()}
+
+    batch = TaskBatchOut(
+        items=[found[i] for i in ids if i in found],
+        missing=[i for i in ids if i not in found]
+    )
+    return Response(content=batch.model_dump_json(), media_type="application/json")
+
+
 @router.get("/tasks/{task_id}", response_model=TaskOut)
 async def get_task(task_id: int, db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(Task).where(Task.id == task_id))
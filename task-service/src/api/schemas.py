@@ -1,7 +1,8 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List, Dict
 from datetime import datetime
 from src.db.models import TaskStatus, TaskPriority
+from src.config import BATCH_GET_MAX_IDS
 
 
 class TaskCreate(BaseModel):
@@ -102,3 +103,12 @@ class TaskStatusUpdate(BaseModel):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     actual_hours: Optional[float] = None
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+
+class TaskBatchOut(BaseModel):
+    items: List[TaskOut]
+    missing: List[int]
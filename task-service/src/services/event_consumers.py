@@ -1,9 +1,11 @@
 import asyncio
-from sqlalchemy import update, select
+from sqlalchemy import update, select, or_, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 from src.services.rabbitmq import consume_events
 from src.db.database import AsyncSessionLocal
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.db.models import Task, TaskStatus
+from src.config import TASK_CANCEL_CHUNK_SIZE
 import logging
 import json
 
@@ -42,11 +44,67 @@ async def handle_user_events(data: dict):
                 await db.commit()
                 logger.info(f"Updated team_id for user {user_id} tasks to {team_id}")
 
+            elif event_type == "users.status_changed_bulk":
+                user_ids = data.get("user_ids", [])
+                new_status = data.get("new_status")
+
+                if new_status in ["suspended", "inactive"]:
+                    await db.execute(
+                        update(Task)
+                        .where(Task.assignee_id == any_(bindparam("ids", user_ids, type_=ARRAY(Integer))))
+                        .where(Task.status.in_([TaskStatus.CREATED, TaskStatus.IN_PROGRESS]))
+                        .values(status=TaskStatus.CANCELLED)
+                    )
+                    await db.commit()
+                    logger.info(f"Cancelled tasks for {len(user_ids)} users due to status change to {new_status}")
+
+            elif event_type == "users.team_assigned_bulk":
+                user_ids = data.get("user_ids", [])
+                team_id = data.get("team_id")
+
+                await db.execute(
+                    update(Task)
+                    .where(Task.assignee_id == any_(bindparam("ids", user_ids, type_=ARRAY(Integer))))
+                    .where(Task.team_id.is_(None))
+                    .values(team_id=team_id)
+                )
+                await db.commit()
+                logger.info(f"Updated team_id for tasks of {len(user_ids)} users to {team_id}")
+
         except Exception as e:
             logger.error(f"Error handling user event: {e}")
             await db.rollback()
 
 
+async def cancel_tasks_in_chunks(condition, db: AsyncSession) -> int:
+    """Отмена активных задач пачками, каждая в своей транзакции - без долгих блокировок на крупных командах"""
+    cancelled = 0
+    while True:
+        batch = (
+            select(Task.id)
+            .where(condition)
+            .where(Task.status.in_([TaskStatus.CREATED, TaskStatus.IN_PROGRESS]))
+            .order_by(Task.id)
+            .limit(TASK_CANCEL_CHUNK_SIZE)
+        )
+        res = await db.execute(
+            update(Task)
+            .where(Task.id.in_(batch))
+            .values(status=TaskStatus.CANCELLED)
+            .returning(Task.id)
+            .execution_options(synchronize_session=False)
+        )
+        count = len(res.all())
+        await db.commit()
+        if not count:
+            return cancelled
+        cancelled += count
+
+
+def _unit_ids_param(unit_ids):
+    return any_(bindparam("unit_ids", unit_ids, type_=ARRAY(Integer)))
+
+
 async def handle_team_events(data: dict):
     """Обработка событий команд"""
     async with AsyncSessionLocal() as db:
@@ -55,27 +113,19 @@ async def handle_team_events(data: dict):
 
             if event_type == "team.deactivated":
                 team_id = data.get("team_id")
+                unit_ids = data.get("unit_ids") or []
 
-                await db.execute(
-                    update(Task)
-                    .where(Task.team_id == team_id)
-                    .where(Task.status.in_([TaskStatus.CREATED, TaskStatus.IN_PROGRESS]))
-                    .values(status=TaskStatus.CANCELLED)
-                )
-                await db.commit()
-                logger.info(f"Cancelled all active tasks for team {team_id}")
+                condition = Task.team_id == team_id
+                if unit_ids:
+                    condition = or_(condition, Task.org_unit_id == _unit_ids_param(unit_ids))
+                cancelled = await cancel_tasks_in_chunks(condition, db)
+                logger.info(f"Cancelled {cancelled} active tasks for team {team_id} ({len(unit_ids)} units)")
 
             elif event_type == "org_unit.deactivated":
-                org_unit_id = data.get("unit_id")
+                unit_ids = data.get("unit_ids") or [data.get("unit_id")]
 
-                await db.execute(
-                    update(Task)
-                    .where(Task.org_unit_id == org_unit_id)
-                    .where(Task.status.in_([TaskStatus.CREATED, TaskStatus.IN_PROGRESS]))
-                    .values(status=TaskStatus.CANCELLED)
-                )
-                await db.commit()
-                logger.info(f"Cancelled all active tasks for org unit {org_unit_id}")
+                cancelled = await cancel_tasks_in_chunks(Task.org_unit_id == _unit_ids_param(unit_ids), db)
+                logger.info(f"Cancelled {cancelled} active tasks for org units {unit_ids}")
 
         except Exception as e:
             logger.error(f"Error handling team event: {e}")
@@ -102,7 +152,10 @@ async def setup_task_consumers():
         consume_events(
             queue_name="task_user_events",
             exchange_name="user_events",
-            routing_keys=["user.status_changed", "user.team_assigned", "user.deleted"],
+            routing_keys=[
+                "user.status_changed", "user.team_assigned", "user.deleted",
+                "users.status_changed_bulk", "users.team_assigned_bulk"
+            ],
             callback=handle_user_events
         )
     )
@@ -0,0 +1,56 @@
+"""Org unit closure table
+
+Revision ID: 5a9c3e7d2f10
+Revises: b0aa54b8c0c0
+Create Date: 2026-10-19 14:12:36.208417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9c3e7d2f10'
+down_revision: Union[str, Sequence[str], None] = 'b0aa54b8c0c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('org_unit_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_org_unit_closure_descendant', 'org_unit_closure', ['descendant_id', 'ancestor_id'],
+                    unique=False)
+
+    # Заполнение по существующим parent_id; path отсекает циклы
+    op.execute("""
+        INSERT INTO org_unit_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE paths (ancestor_id, descendant_id, depth, path) AS (
+            SELECT id, id, 0, ARRAY[id] FROM org_units
+            UNION ALL
+            SELECT p.ancestor_id, u.id, p.depth + 1, p.path || u.id
+            FROM paths p JOIN org_units u ON u.parent_id = p.descendant_id
+            WHERE u.id <> ALL (p.path)
+        )
+        SELECT ancestor_id, descendant_id, min(depth) FROM paths GROUP BY ancestor_id, descendant_id
+    """)
+    op.execute("""
+        UPDATE org_units u SET level = c.max_depth + 1
+        FROM (
+            SELECT descendant_id, max(depth) AS max_depth FROM org_unit_closure GROUP BY descendant_id
+        ) c
+        WHERE u.id = c.descendant_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_org_unit_closure_descendant', table_name='org_unit_closure')
+    op.drop_table('org_unit_closure')
@@ -0,0 +1,41 @@
+"""Org members validity range index
+
+Revision ID: 7f3a1c5e9b24
+Revises: e2b7d94c1a38
+Create Date: 2026-10-19 16:30:44.081275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3a1c5e9b24'
+down_revision: Union[str, Sequence[str], None] = 'e2b7d94c1a38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tstzrange не допускает нижнюю границу больше верхней
+    op.execute('UPDATE org_members SET end_date = start_date WHERE end_date < start_date')
+    op.create_check_constraint(
+        'ck_org_members_validity', 'org_members', 'end_date IS NULL OR end_date >= start_date'
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_org_members_validity', 'org_members', [sa.text('tstzrange(start_date, end_date)')],
+            unique=False,
+            postgresql_using='gist',
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_org_members_validity', table_name='org_members', postgresql_concurrently=True)
+    op.drop_constraint('ck_org_members_validity', 'org_members', type_='check')
@@ -0,0 +1,28 @@
+"""Org members suspension marker
+
+Revision ID: a1c7e3f92b58
+Revises: f2d8b4a6c913
+Create Date: 2026-10-20 10:12:05.331842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c7e3f92b58'
+down_revision: Union[str, Sequence[str], None] = 'f2d8b4a6c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('org_members', sa.Column('suspended_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('org_members', 'suspended_at')
@@ -0,0 +1,36 @@
+"""Team news excerpt
+
+Revision ID: a4f6e2d83c19
+Revises: c81d0f4b6e57
+Create Date: 2026-10-19 17:42:51.930614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f6e2d83c19'
+down_revision: Union[str, Sequence[str], None] = 'c81d0f4b6e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('team_news', sa.Column('excerpt', sa.Text(), nullable=True))
+    # Приближение make_excerpt для уже существующих новостей
+    op.execute("""
+        UPDATE team_news SET excerpt = CASE
+            WHEN length(btrim(regexp_replace(content, '\\s+', ' ', 'g'))) <= 280
+                THEN btrim(regexp_replace(content, '\\s+', ' ', 'g'))
+            ELSE rtrim(left(btrim(regexp_replace(content, '\\s+', ' ', 'g')), 279)) || '…'
+        END
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('team_news', 'excerpt')
@@ -0,0 +1,54 @@
+"""News sequence numbers and read states
+
+Revision ID: b3e8f1a6d720
+Revises: d5b9a7c3e1f2
+Create Date: 2026-10-19 19:02:33.870145
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8f1a6d720'
+down_revision: Union[str, Sequence[str], None] = 'd5b9a7c3e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('teams', sa.Column('news_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('team_news', sa.Column('seq', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE team_news n SET seq = s.seq
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY team_id ORDER BY created_at, id) AS seq FROM team_news
+        ) s
+        WHERE n.id = s.id
+    """)
+    op.execute("""
+        UPDATE teams t SET news_seq = s.max_seq
+        FROM (SELECT team_id, max(seq) AS max_seq FROM team_news GROUP BY team_id) s
+        WHERE t.id = s.team_id
+    """)
+    op.create_index('ix_team_news_team_seq', 'team_news', ['team_id', 'seq'], unique=True)
+
+    op.create_table('news_read_states',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('watermark', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('bitmap', sa.LargeBinary(), server_default='', nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'team_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('news_read_states')
+    op.drop_index('ix_team_news_team_seq', table_name='team_news')
+    op.drop_column('team_news', 'seq')
+    op.drop_column('teams', 'news_seq')
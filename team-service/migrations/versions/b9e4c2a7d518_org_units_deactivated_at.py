@@ -0,0 +1,30 @@
+"""Org units deactivated_at
+
+Revision ID: b9e4c2a7d518
+Revises: d7f3b18e4a90
+Create Date: 2026-10-19 17:32:54.218460
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9e4c2a7d518'
+down_revision: Union[str, Sequence[str], None] = 'd7f3b18e4a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('org_units', sa.Column('deactivated_at', sa.DateTime(timezone=True), nullable=True))
+    # Точного момента для уже деактивированных нет; updated_at - лучшая доступная оценка
+    op.execute("UPDATE org_units SET deactivated_at = coalesce(updated_at, created_at) WHERE NOT is_active")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('org_units', 'deactivated_at')
@@ -0,0 +1,41 @@
+"""Assign news seq on publication
+
+Revision ID: c4a9d2e7f316
+Revises: a1c7e3f92b58
+Create Date: 2026-10-20 10:41:27.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a9d2e7f316'
+down_revision: Union[str, Sequence[str], None] = 'a1c7e3f92b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Черновики получат новый seq при публикации, выше watermark всех читателей
+    op.execute("UPDATE team_news SET seq = NULL WHERE NOT coalesce(is_published, false)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("""
+        UPDATE team_news n SET seq = s.seq
+        FROM (
+            SELECT n2.id, t.news_seq + row_number() OVER (PARTITION BY n2.team_id ORDER BY n2.id) AS seq
+            FROM team_news n2 JOIN teams t ON t.id = n2.team_id
+            WHERE n2.seq IS NULL
+        ) s
+        WHERE n.id = s.id
+    """)
+    op.execute("""
+        UPDATE teams t SET news_seq = s.max_seq
+        FROM (SELECT team_id, max(seq) AS max_seq FROM team_news GROUP BY team_id) s
+        WHERE t.id = s.team_id
+    """)
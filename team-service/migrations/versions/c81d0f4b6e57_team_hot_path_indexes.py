@@ -0,0 +1,47 @@
+"""Team service hot path indexes
+
+Revision ID: c81d0f4b6e57
+Revises: 7f3a1c5e9b24
+Create Date: 2026-10-19 17:05:18.447902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d0f4b6e57'
+down_revision: Union[str, Sequence[str], None] = '7f3a1c5e9b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = (
+    ('ix_org_members_user_id_is_active', 'org_members', ['user_id', 'is_active'], None),
+    ('ix_org_members_org_unit_id_is_active', 'org_members', ['org_unit_id', 'is_active'], None),
+    ('ix_org_members_manager_id_active', 'org_members', ['manager_id'], 'is_active'),
+    ('ix_org_units_team_id_active', 'org_units', ['team_id'], 'is_active'),
+    ('ix_team_news_team_feed', 'team_news',
+     ['team_id', sa.text('created_at DESC'), sa.text('id DESC')], 'is_published'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
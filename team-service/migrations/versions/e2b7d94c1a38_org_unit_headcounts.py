@@ -0,0 +1,46 @@
+"""Org unit headcount rollups
+
+Revision ID: e2b7d94c1a38
+Revises: 5a9c3e7d2f10
+Create Date: 2026-10-19 15:47:02.613058
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7d94c1a38'
+down_revision: Union[str, Sequence[str], None] = '5a9c3e7d2f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('org_units', sa.Column('direct_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('org_units', sa.Column('subtree_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE org_units u SET direct_count = c.n
+        FROM (
+            SELECT org_unit_id, count(*) AS n FROM org_members WHERE is_active GROUP BY org_unit_id
+        ) c
+        WHERE u.id = c.org_unit_id
+    """)
+    op.execute("""
+        UPDATE org_units u SET subtree_count = s.n
+        FROM (
+            SELECT cl.ancestor_id, sum(x.direct_count) AS n
+            FROM org_unit_closure cl JOIN org_units x ON x.id = cl.descendant_id
+            GROUP BY cl.ancestor_id
+        ) s
+        WHERE u.id = s.ancestor_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('org_units', 'subtree_count')
+    op.drop_column('org_units', 'direct_count')
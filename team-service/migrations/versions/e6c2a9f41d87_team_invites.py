@@ -0,0 +1,50 @@
+"""Team invites with expiry and usage limits
+
+Revision ID: e6c2a9f41d87
+Revises: b3e8f1a6d720
+Create Date: 2026-10-19 19:48:12.305617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c2a9f41d87'
+down_revision: Union[str, Sequence[str], None] = 'b3e8f1a6d720'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('team_invites',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('code', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('max_uses', sa.Integer(), nullable=True),
+    sa.Column('used_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('is_active', sa.Boolean(), server_default=sa.text('true'), nullable=False),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.CheckConstraint('max_uses IS NULL OR used_count <= max_uses', name='ck_team_invites_uses'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('code')
+    )
+    op.create_index(op.f('ix_team_invites_id'), 'team_invites', ['id'], unique=False)
+    op.create_index(op.f('ix_team_invites_team_id'), 'team_invites', ['team_id'], unique=False)
+    # Существующие коды команд становятся бессрочными приглашениями без лимита
+    op.execute("""
+        INSERT INTO team_invites (team_id, code, is_active, created_by)
+        SELECT id, invite_code, coalesce(is_active, true), owner_id FROM teams WHERE invite_code IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_team_invites_team_id'), table_name='team_invites')
+    op.drop_index(op.f('ix_team_invites_id'), table_name='team_invites')
+    op.drop_table('team_invites')
@@ -0,0 +1,37 @@
+"""Org structure change log
+
+Revision ID: f2d8b4a6c913
+Revises: e6c2a9f41d87
+Create Date: 2026-10-19 20:31:47.582014
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2d8b4a6c913'
+down_revision: Union[str, Sequence[str], None] = 'e6c2a9f41d87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('teams', sa.Column('org_seq', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('org_changes',
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('team_id', 'seq')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('org_changes')
+    op.drop_column('teams', 'org_seq')
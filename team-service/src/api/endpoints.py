@@ -1,17 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func, and_, join
-from src.api.utils import get_managers_chain, get_subordinates, build_unit_tree
+from sqlalchemy import select, update, delete, func, and_, or_, join, any_, bindparam, Integer, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from src.api.utils import (
+    get_managers_chain, get_subordinates, subtree_unit_ids, is_unit_ancestor,
+    add_unit_to_closure, move_unit_subtree, deactivate_unit_subtree, deactivate_team_cascade, apply_headcount_deltas,
+    record_org_changes, invite_usable_filter, invite_rejection, membership_filter, make_excerpt, encode_cursor,
+    decode_cursor, news_search_clauses, news_headline, NEWS_SEARCH_CONFIGS, TITLE_HEADLINE_OPTIONS
+)
+from src.config import (
+    ORG_HIERARCHY_MAX_DEPTH, ORG_STRUCTURE_MAX_DEPTH, ORG_CHANGES_COMPACTION_THRESHOLD, NEWS_FEED_PAGE_SIZE
+)
 from src.db.database import get_db
-from src.db.models import Team, OrgUnit, OrgMember, TeamNews
+from src.db.models import Team, TeamInvite, OrgChange, OrgUnit, OrgUnitClosure, OrgMember, TeamNews
 from src.api.schemas import (
-    TeamCreate, TeamUpdate, TeamOut,
-    OrgUnitCreate, OrgUnitUpdate, OrgUnitOut,
-    OrgMemberCreate, OrgMemberUpdate, OrgMemberOut,
-    TeamNewsCreate, TeamNewsUpdate, TeamNewsOut
+    TeamCreate, TeamUpdate, TeamOut, TeamInviteCreate, TeamInviteOut, InviteRedeem,
+    BatchGetRequest, TeamBatchOut, IsManagerOfRequest, IsManagerOfOut,
+    OrgUnitCreate, OrgUnitUpdate, OrgUnitMove, OrgUnitOut,
+    OrgMemberCreate, OrgMemberUpdate, OrgMemberOut, OrgMemberBulkRequest, OrgMemberBulkOut, OrgChangesOut,
+    TeamNewsCreate, TeamNewsUpdate, TeamNewsOut, TeamNewsFeedOut, NewsSearchOut, NewsMarkRead, NewsUnreadOut
 )
 from src.services.rabbitmq import publish_event
+from src.services.org_snapshot import (
+    OrgSnapshot, get_org_snapshot, load_org_snapshot_as_of, patch_org_members, invalidate_org_snapshot,
+    member_record
+)
+from src.services.org_import import import_org_members
+from src.services.news_feed import get_cached_first_page, cache_first_page, invalidate_news_feed, news_feed_version
+from src.services.news_reads import (
+    get_unread_count, get_read_state, mark_news_read, update_team_news_index, remove_from_team_news_index
+)
+from src.services.auth import get_current_user_id
 import secrets
+from datetime import datetime, timezone
 from typing import List, Optional
 
 router = APIRouter()
@@ -27,6 +48,8 @@ async def create_team(payload: TeamCreate, db: AsyncSession = Depends(get_db)):
         invite_code=invite_code
     )
     db.add(team)
+    await db.flush()
+    db.add(TeamInvite(team_id=team.id, code=invite_code, created_by=payload.owner_id))
     await db.commit()
     await db.refresh(team)
 
@@ -47,6 +70,21 @@ async def get_teams(db: AsyncSession = Depends(get_db)):
     return teams
 
 
+@router.post("/teams:batchGet", response_model=TeamBatchOut)
+async def batch_get_teams(payload: BatchGetRequest, db: AsyncSession = Depends(get_db)):
+    ids = list(dict.fromkeys(payload.ids))
+    res = await db.execute(
+        select(Team).where(Team.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
+    )
+    found = {team.id: team for team in res.scalars().all()}
+
+    batch = TeamBatchOut(
+        items=[found[i] for i in ids if i in found],
+        missing=[i for i in ids if i not in found]
+    )
+    return Response(content=batch.model_dump_json(), media_type="application/json")
+
+
 @router.get("/teams/{team_id}", response_model=TeamOut)
 async def get_team(team_id: int, db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(Team).where(Team.id == team_id))
@@ -73,6 +111,9 @@ async def update_team(team_id: int, payload: TeamUpdate, db: AsyncSession = Depe
 
         await publish_event("team.updated", {
             "team_id": team_id,
+            "name": team.name,
+            "invite_code": team.invite_code,
+            "is_active": team.is_active,
             "updated_fields": list(update_data.keys())
         })
 
@@ -90,11 +131,23 @@ async def delete_team(team_id: int, db: AsyncSession = Depends(get_db)):
     await db.execute(
         update(Team).where(Team.id == team_id).values(is_active=False)
     )
+    await db.execute(
+        update(TeamInvite)
+        .where(and_(TeamInvite.team_id == team_id, TeamInvite.is_active == True))
+        .values(is_active=False)
+    )
     await db.commit()
 
+    # Команда уже неактивна; оставшееся доделает повторный DELETE, если каскад прервется
+    unit_ids, members_count = await deactivate_team_cascade(team_id, db)
+    invalidate_org_snapshot(team_id)
+
     await publish_event("team.deactivated", {
         "team_id": team_id,
-        "name": team.name
+        "name": team.name,
+        "invite_code": team.invite_code,
+        "unit_ids": unit_ids,
+        "members_deactivated": members_count
     })
 
     return {"message": "Team deactivated successfully"}
@@ -111,6 +164,8 @@ async def create_org_unit(payload: OrgUnitCreate, db: AsyncSession = Depends(get
         parent = parent_res.scalar_one_or_none()
         if not parent:
             raise HTTPException(status_code=404, detail="Parent unit not found")
+        if parent.team_id != payload.team_id:
+            raise HTTPException(status_code=400, detail="Parent unit belongs to another team")
         level = parent.level + 1
     else:
         level = 1
@@ -123,9 +178,14 @@ async def create_org_unit(payload: OrgUnitCreate, db: AsyncSession = Depends(get
         level=level
     )
     db.add(unit)
+    await db.flush()
+    await add_unit_to_closure(unit.id, unit.parent_id, db)
+    await record_org_changes(unit.team_id, db, unit_ids=[unit.id])
     await db.commit()
     await db.refresh(unit)
 
+    invalidate_org_snapshot(unit.team_id)
+
     await publish_event("org_unit.created", {
         "unit_id": unit.id,
         "team_id": unit.team_id,
@@ -156,6 +216,21 @@ async def get_org_unit(unit_id: int, db: AsyncSession = Depends(get_db)):
     return unit
 
 
+async def _get_move_target(unit: OrgUnit, parent_id: Optional[int], db: AsyncSession) -> Optional[OrgUnit]:
+    if not parent_id:
+        return None
+
+    parent_res = await db.execute(select(OrgUnit).where(OrgUnit.id == parent_id))
+    parent = parent_res.scalar_one_or_none()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Parent unit not found")
+    if parent.team_id != unit.team_id:
+        raise HTTPException(status_code=400, detail="Parent unit belongs to another team")
+    if await is_unit_ancestor(unit.id, parent.id, db):
+        raise HTTPException(status_code=400, detail="Cannot move unit into its own subtree")
+    return parent
+
+
 @router.put("/org_units/{unit_id}", response_model=OrgUnitOut)
 async def update_org_unit(unit_id: int, payload: OrgUnitUpdate, db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(OrgUnit).where(OrgUnit.id == unit_id))
@@ -164,22 +239,85 @@ async def update_org_unit(unit_id: int, payload: OrgUnitUpdate, db: AsyncSession
         raise HTTPException(status_code=404, detail="Organizational unit not found")
 
     update_data = payload.dict(exclude_unset=True)
-    if update_data:
-        await db.execute(
-            update(OrgUnit).where(OrgUnit.id == unit_id).values(**update_data)
-        )
+    moved_ids = []
+    if "parent_id" in update_data:
+        parent_id = update_data.pop("parent_id")
+        if parent_id != unit.parent_id:
+            parent = await _get_move_target(unit, parent_id, db)
+            moved_ids = await move_unit_subtree(unit, parent, db)
+
+    if update_data or moved_ids:
+        if update_data:
+            await db.execute(
+                update(OrgUnit).where(OrgUnit.id == unit_id).values(**update_data)
+            )
+        await record_org_changes(unit.team_id, db, unit_ids=[unit_id, *moved_ids])
         await db.commit()
         await db.refresh(unit)
+        invalidate_org_snapshot(unit.team_id)
 
         await publish_event("org_unit.updated", {
             "unit_id": unit_id,
             "team_id": unit.team_id,
-            "updated_fields": list(update_data.keys())
+            "updated_fields": list(update_data.keys()) + (["parent_id", "level"] if moved_ids else [])
         })
+        if moved_ids:
+            await publish_event("org_unit.moved", {
+                "unit_id": unit_id,
+                "team_id": unit.team_id,
+                "parent_id": unit.parent_id,
+                "unit_ids": moved_ids
+            })
 
     return unit
 
 
+@router.post("/org_units/{unit_id}/move", response_model=OrgUnitOut)
+async def move_org_unit(unit_id: int, payload: OrgUnitMove, db: AsyncSession = Depends(get_db)):
+    res = await db.execute(select(OrgUnit).where(OrgUnit.id == unit_id))
+    unit = res.scalar_one_or_none()
+    if not unit:
+        raise HTTPException(status_code=404, detail="Organizational unit not found")
+
+    parent = await _get_move_target(unit, payload.parent_id, db)
+    moved_ids = await move_unit_subtree(unit, parent, db)
+    await record_org_changes(unit.team_id, db, unit_ids=[unit_id, *moved_ids])
+    await db.commit()
+    await db.refresh(unit)
+    invalidate_org_snapshot(unit.team_id)
+
+    await publish_event("org_unit.moved", {
+        "unit_id": unit_id,
+        "team_id": unit.team_id,
+        "parent_id": unit.parent_id,
+        "unit_ids": moved_ids
+    })
+
+    return unit
+
+
+@router.get("/org_units/{unit_id}/descendants", response_model=List[OrgUnitOut])
+async def get_org_unit_descendants(unit_id: int, db: AsyncSession = Depends(get_db)):
+    res = await db.execute(
+        select(OrgUnit)
+        .join(OrgUnitClosure, OrgUnitClosure.descendant_id == OrgUnit.id)
+        .where(
+            and_(
+                OrgUnitClosure.ancestor_id == unit_id,
+                OrgUnitClosure.depth > 0,
+                OrgUnit.is_active == True
+            )
+        )
+        .order_by(OrgUnitClosure.depth, OrgUnit.id)
+    )
+    return res.scalars().all()
+
+
+@router.get("/org_units/{unit_id}/contains/{other_id}")
+async def org_unit_contains(unit_id: int, other_id: int, db: AsyncSession = Depends(get_db)):
+    return {"contains": await is_unit_ancestor(unit_id, other_id, db)}
+
+
 @router.delete("/org_units/{unit_id}")
 async def delete_org_unit(unit_id: int, db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(OrgUnit).where(OrgUnit.id == unit_id))
@@ -187,19 +325,25 @@ async def delete_org_unit(unit_id: int, db: AsyncSession = Depends(get_db)):
     if not unit:
         raise HTTPException(status_code=404, detail="Organizational unit not found")
 
-    await db.execute(
-        update(OrgUnit).where(OrgUnit.id == unit_id).values(is_active=False)
-    )
+    unit_ids, member_ids = await deactivate_unit_subtree(unit_id, db)
+    await record_org_changes(unit.team_id, db, unit_ids=unit_ids, member_ids=member_ids)
     await db.commit()
+    invalidate_org_snapshot(unit.team_id)
 
     await publish_event("org_unit.deactivated", {
         "unit_id": unit_id,
-        "team_id": unit.team_id
+        "team_id": unit.team_id,
+        "unit_ids": unit_ids
     })
 
     return {"message": "Organizational unit deactivated successfully"}
 
 
+async def _unit_team_id(unit_id: int, db: AsyncSession) -> Optional[int]:
+    res = await db.execute(select(OrgUnit.team_id).where(OrgUnit.id == unit_id))
+    return res.scalar_one_or_none()
+
+
 @router.post("/org_members", response_model=OrgMemberOut)
 async def add_member(payload: OrgMemberCreate, db: AsyncSession = Depends(get_db)):
     unit_res = await db.execute(select(OrgUnit).where(OrgUnit.id == payload.org_unit_id))
@@ -224,8 +368,13 @@ async def add_member(payload: OrgMemberCreate, db: AsyncSession = Depends(get_db
         manager_id=payload.manager_id
     )
     db.add(member)
+    await apply_headcount_deltas({unit.id: 1}, db)
+    await db.flush()
+    await record_org_changes(unit.team_id, db, member_ids=[member.id])
     await db.commit()
     await db.refresh(member)
+    if unit.is_active:
+        patch_org_members(unit.team_id, upserts=[member_record(member)])
 
     await publish_event("org_member.added", {
         "member_id": member.id,
@@ -237,11 +386,21 @@ async def add_member(payload: OrgMemberCreate, db: AsyncSession = Depends(get_db
     return member
 
 
+@router.post("/org_members/bulk", response_model=OrgMemberBulkOut)
+async def bulk_place_members(payload: OrgMemberBulkRequest, db: AsyncSession = Depends(get_db)):
+    """Размещение сотрудников и правка руководителей одним запросом; при любой ошибке ничего не меняется"""
+    if not payload.placements and not payload.managers:
+        raise HTTPException(status_code=400, detail="Either placements or managers must be provided")
+    return await import_org_members(payload, db)
+
+
 @router.get("/org_members", response_model=List[OrgMemberOut])
 async def get_members(org_unit_id: Optional[int] = None, team_id: Optional[int] = None,
-                      db: AsyncSession = Depends(get_db)):
+                      include_subunits: bool = False, db: AsyncSession = Depends(get_db)):
     query = select(OrgMember).where(OrgMember.is_active == True)
-    if org_unit_id:
+    if org_unit_id and include_subunits:
+        query = query.where(OrgMember.org_unit_id.in_(subtree_unit_ids(org_unit_id)))
+    elif org_unit_id:
         query = query.where(OrgMember.org_unit_id == org_unit_id)
     elif team_id:
         unit_ids = await db.execute(
@@ -264,16 +423,49 @@ async def update_member(member_id: int, payload: OrgMemberUpdate, db: AsyncSessi
         raise HTTPException(status_code=404, detail="Member not found")
 
     update_data = payload.dict(exclude_unset=True)
+    end_date = update_data.get("end_date")
+    if end_date and end_date.tzinfo is None:
+        end_date = update_data["end_date"] = end_date.replace(tzinfo=timezone.utc)
+    if end_date and member.start_date and end_date < member.start_date:
+        raise HTTPException(status_code=400, detail="end_date cannot be earlier than start_date")
     if update_data:
+        values = {k: v for k, v in update_data.items() if k != "is_active"}
+        if "is_active" in update_data:
+            is_active = update_data["is_active"]
+            # Переход состояния условным UPDATE: счетчики меняются, только если строка действительно перешла.
+            # Интервал start_date..end_date - источник истории для запросов as_of
+            transition = {"is_active": is_active}
+            if "end_date" not in update_data:
+                transition["end_date"] = None if is_active else func.now()
+            res = await db.execute(
+                update(OrgMember)
+                .where(and_(OrgMember.id == member_id, OrgMember.is_active.is_distinct_from(is_active)))
+                .values(**transition)
+                .returning(OrgMember.org_unit_id)
+                .execution_options(synchronize_session=False)
+            )
+            unit_id = res.scalar_one_or_none()
+            if unit_id is not None:
+                await apply_headcount_deltas({unit_id: 1 if is_active else -1}, db)
+            # Явное решение администратора отменяет восстановление после разблокировки
+            values["suspended_at"] = None
         await db.execute(
-            update(OrgMember).where(OrgMember.id == member_id).values(**update_data)
+            update(OrgMember).where(OrgMember.id == member_id).values(**values)
         )
+        team_id = await _unit_team_id(member.org_unit_id, db)
+        await record_org_changes(team_id, db, member_ids=[member_id])
         await db.commit()
         await db.refresh(member)
 
+        if member.is_active:
+            patch_org_members(team_id, upserts=[member_record(member)])
+        else:
+            patch_org_members(team_id, removed_ids=[member_id])
+
         await publish_event("org_member.updated", {
             "member_id": member_id,
             "user_id": member.user_id,
+            "team_id": team_id,
             "updated_fields": list(update_data.keys())
         })
 
@@ -287,39 +479,79 @@ async def remove_member(member_id: int, db: AsyncSession = Depends(get_db)):
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
 
-    await db.execute(
-        update(OrgMember).where(OrgMember.id == member_id).values(
-            is_active=False,
-            end_date=func.now()
-        )
+    # Уже закрытое членство не трогаем: иначе второй DELETE повторно уменьшил бы счетчики и затер end_date
+    res = await db.execute(
+        update(OrgMember)
+        .where(and_(OrgMember.id == member_id, OrgMember.is_active == True))
+        .values(is_active=False, end_date=func.now(), suspended_at=None)
+        .returning(OrgMember.org_unit_id)
+        .execution_options(synchronize_session=False)
     )
+    unit_id = res.scalar_one_or_none()
+    if unit_id is None:
+        await db.execute(
+            update(OrgMember).where(OrgMember.id == member_id).values(suspended_at=None)
+        )
+        await db.commit()
+        return {"message": "Member removed successfully"}
+
+    await apply_headcount_deltas({unit_id: -1}, db)
+    team_id = await _unit_team_id(unit_id, db)
+    await record_org_changes(team_id, db, member_ids=[member_id])
     await db.commit()
 
+    patch_org_members(team_id, removed_ids=[member_id])
+
     await publish_event("org_member.removed", {
         "member_id": member_id,
         "user_id": member.user_id,
-        "org_unit_id": member.org_unit_id
+        "org_unit_id": member.org_unit_id,
+        "team_id": team_id
     })
 
     return {"message": "Member removed successfully"}
 
 
+async def _next_news_seq(team_id: int, db: AsyncSession) -> Optional[int]:
+    """
+    Номер выдается при публикации, а не при создании: черновик с меньшим seq иначе
+    оказался бы ниже watermark читателей и после публикации считался прочитанным
+    """
+    res = await db.execute(
+        update(Team)
+        .where(Team.id == team_id)
+        .values(news_seq=Team.news_seq + 1, updated_at=Team.updated_at)
+        .returning(Team.news_seq)
+    )
+    return res.scalar_one_or_none()
+
+
 @router.post("/news", response_model=TeamNewsOut)
 async def create_news(payload: TeamNewsCreate, db: AsyncSession = Depends(get_db)):
-    team_res = await db.execute(select(Team).where(Team.id == payload.team_id))
-    if not team_res.scalar_one_or_none():
-        raise HTTPException(status_code=404, detail="Team not found")
+    if payload.is_published:
+        seq = await _next_news_seq(payload.team_id, db)
+        if seq is None:
+            raise HTTPException(status_code=404, detail="Team not found")
+    else:
+        seq = None
+        team_res = await db.execute(select(Team.id).where(Team.id == payload.team_id))
+        if team_res.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Team not found")
 
     news = TeamNews(
         team_id=payload.team_id,
         author_id=payload.author_id,
+        seq=seq,
         title=payload.title,
         content=payload.content,
+        excerpt=make_excerpt(payload.content),
         is_published=payload.is_published
     )
     db.add(news)
     await db.commit()
     await db.refresh(news)
+    invalidate_news_feed(news.team_id)
+    update_team_news_index(news.team_id, news.id, news.seq, news.is_published)
 
     await publish_event("team_news.created", {
         "news_id": news.id,
@@ -343,6 +575,136 @@ async def get_news(team_id: Optional[int] = None, db: AsyncSession = Depends(get
     return news_list
 
 
+@router.get("/news/feed", response_model=TeamNewsFeedOut)
+async def get_news_feed(
+        team_id: int,
+        limit: int = Query(NEWS_FEED_PAGE_SIZE, ge=1, le=100),
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """Лента новостей команды: только заголовок и фрагмент, полный текст - через /news/{news_id}"""
+    cacheable = cursor is None and limit == NEWS_FEED_PAGE_SIZE
+    if cacheable:
+        page = get_cached_first_page(team_id)
+        if page is not None:
+            return page
+        version = news_feed_version(team_id)
+
+    query = select(
+        TeamNews.id,
+        TeamNews.team_id,
+        TeamNews.author_id,
+        TeamNews.title,
+        TeamNews.excerpt,
+        TeamNews.created_at
+    ).where(
+        and_(
+            TeamNews.team_id == team_id,
+            TeamNews.is_published == True
+        )
+    )
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, 2)
+        try:
+            last_created_at = datetime.fromisoformat(last_created_at)
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(TeamNews.created_at, TeamNews.id) < tuple_(last_created_at, last_id))
+
+    res = await db.execute(
+        query.order_by(TeamNews.created_at.desc(), TeamNews.id.desc()).limit(limit + 1)
+    )
+    rows = res.all()
+
+    items = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last["created_at"].isoformat(), last["id"])
+
+    page = TeamNewsFeedOut(items=items, next_cursor=next_cursor)
+    if cacheable:
+        cache_first_page(team_id, page, version)
+    return page
+
+
+@router.get("/news/unread_count", response_model=NewsUnreadOut)
+async def get_news_unread_count(
+        team_id: int,
+        user_id: int = Depends(get_current_user_id),
+        db: AsyncSession = Depends(get_db)
+):
+    unread = await get_unread_count(user_id, team_id, db)
+    state = await get_read_state(user_id, team_id, db)
+    return {"team_id": team_id, "unread_count": unread, "last_read_seq": state.watermark}
+
+
+@router.post("/news/mark_read", response_model=NewsUnreadOut)
+async def mark_news_as_read(
+        payload: NewsMarkRead,
+        user_id: int = Depends(get_current_user_id),
+        db: AsyncSession = Depends(get_db)
+):
+    if not payload.all and not payload.news_ids:
+        raise HTTPException(status_code=400, detail="Either news_ids or all must be provided")
+
+    state = await mark_news_read(user_id, payload.team_id, db, payload.news_ids, payload.all)
+    unread = await get_unread_count(user_id, payload.team_id, db)
+    return {"team_id": payload.team_id, "unread_count": unread, "last_read_seq": state.watermark}
+
+
+@router.get("/news/search", response_model=NewsSearchOut)
+async def search_news(
+        q: str = Query(..., min_length=1, max_length=200),
+        team_id: Optional[int] = None,
+        lang: str = Query("auto", pattern="^(auto|ru|en)$"),
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """Полнотекстовый поиск по опубликованным новостям, сортировка (rank DESC, id DESC)"""
+    tsquery, condition, rank = news_search_clauses(q, lang)
+
+    page = select(TeamNews.id, rank.label("rank")).where(
+        and_(condition, TeamNews.is_published == True)
+    )
+    if team_id:
+        page = page.where(TeamNews.team_id == team_id)
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor, 2)
+        if not isinstance(last_rank, (int, float)) or not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        page = page.where(or_(rank < last_rank, and_(rank == last_rank, TeamNews.id < last_id)))
+    page = page.order_by(rank.desc(), TeamNews.id.desc()).limit(limit + 1).subquery("page")
+
+    # ts_headline дорогой, поэтому считаем его только для строк страницы
+    config = NEWS_SEARCH_CONFIGS[lang][0]
+    res = await db.execute(
+        select(
+            TeamNews.id,
+            TeamNews.team_id,
+            TeamNews.author_id,
+            TeamNews.title,
+            TeamNews.excerpt,
+            TeamNews.created_at,
+            page.c.rank,
+            news_headline(config, TeamNews.title, tsquery, TITLE_HEADLINE_OPTIONS).label("title_highlight"),
+            news_headline(config, TeamNews.content, tsquery).label("content_highlight")
+        )
+        .join(page, page.c.id == TeamNews.id)
+        .order_by(page.c.rank.desc(), TeamNews.id.desc())
+    )
+    rows = res.all()
+
+    items = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1]["rank"], items[-1]["id"])
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
 @router.get("/news/{news_id}", response_model=TeamNewsOut)
 async def get_news_item(news_id: int, db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(TeamNews).where(TeamNews.id == news_id))
@@ -361,11 +723,18 @@ async def update_news(news_id: int, payload: TeamNewsUpdate, db: AsyncSession =
 
     update_data = payload.dict(exclude_unset=True)
     if update_data:
+        values = dict(update_data)
+        if update_data.get("content") is not None:
+            values["excerpt"] = make_excerpt(update_data["content"])
+        if update_data.get("is_published") and news.seq is None:
+            values["seq"] = await _next_news_seq(news.team_id, db)
         await db.execute(
-            update(TeamNews).where(TeamNews.id == news_id).values(**update_data)
+            update(TeamNews).where(TeamNews.id == news_id).values(**values)
         )
         await db.commit()
         await db.refresh(news)
+        invalidate_news_feed(news.team_id)
+        update_team_news_index(news.team_id, news.id, news.seq, news.is_published)
 
         await publish_event("team_news.updated", {
             "news_id": news_id,
@@ -385,6 +754,8 @@ async def delete_news(news_id: int, db: AsyncSession = Depends(get_db)):
 
     await db.execute(delete(TeamNews).where(TeamNews.id == news_id))
     await db.commit()
+    invalidate_news_feed(news.team_id)
+    remove_from_team_news_index(news.team_id, news_id)
 
     await publish_event("team_news.deleted", {
         "news_id": news_id,
@@ -394,55 +765,94 @@ async def delete_news(news_id: int, db: AsyncSession = Depends(get_db)):
     return {"message": "News deleted successfully"}
 
 
+def _not_modified(snapshot: OrgSnapshot, response: Response, if_none_match: Optional[str]) -> bool:
+    response.headers["ETag"] = snapshot.etag
+    response.headers["X-Org-Seq"] = str(snapshot.org_seq)
+    return if_none_match == snapshot.etag
+
+
+async def _team_snapshot(team_id: int, as_of: Optional[datetime], db: AsyncSession) -> OrgSnapshot:
+    if as_of is not None:
+        return await load_org_snapshot_as_of(team_id, as_of, db)
+    return await get_org_snapshot(team_id, db)
+
+
 @router.get("/org_structure/{team_id}")
 async def get_org_structure(
         team_id: int,
-        depth: int = 3,
+        response: Response,
+        depth: int = Query(3, ge=1, le=ORG_STRUCTURE_MAX_DEPTH),
+        as_of: Optional[datetime] = None,
+        if_none_match: Optional[str] = Header(None),
         db: AsyncSession = Depends(get_db)
 ):
-    units_res = await db.execute(
-        select(OrgUnit).where(
-            and_(
-                OrgUnit.team_id == team_id,
-                OrgUnit.is_active == True
-            )
-        ).order_by(OrgUnit.level)
-    )
-    units = units_res.scalars().all()
-
-    if not units:
+    snapshot = await _team_snapshot(team_id, as_of, db)
+    if not snapshot.units:
         raise HTTPException(status_code=404, detail="No organizational units found")
+    if as_of is None and _not_modified(snapshot, response, if_none_match):
+        return Response(status_code=304, headers={"ETag": snapshot.etag, "X-Org-Seq": str(snapshot.org_seq)})
+
+    return snapshot.tree(depth)
 
-    root_units = [u for u in units if u.level == 1]
-    org_tree = []
 
-    for unit in root_units:
-        org_tree.append(await build_unit_tree(unit, units, depth, db))
+@router.get("/org_structure/{team_id}/member_counts")
+async def get_org_member_counts(
+        team_id: int,
+        response: Response,
+        as_of: Optional[datetime] = None,
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_db)
+):
+    snapshot = await _team_snapshot(team_id, as_of, db)
+    if as_of is None and _not_modified(snapshot, response, if_none_match):
+        return Response(status_code=304, headers={"ETag": snapshot.etag})
 
-    return org_tree
+    return {
+        "team_id": team_id,
+        "version": snapshot.version,
+        "org_seq": snapshot.org_seq,
+        "units": snapshot.member_counts(),
+        "total_count": snapshot.total_count()
+    }
 
 
 @router.get("/org_members/{user_id}/hierarchy")
 async def get_user_hierarchy(
         user_id: int,
+        response: Response,
+        team_id: Optional[int] = Query(None, description="Serve from the team's cached org snapshot"),
+        max_depth: int = Query(ORG_HIERARCHY_MAX_DEPTH, ge=1, le=100),
+        as_of: Optional[datetime] = None,
+        if_none_match: Optional[str] = Header(None),
         db: AsyncSession = Depends(get_db)
 ):
-    member_res = await db.execute(
-        select(OrgMember).where(
-            and_(
-                OrgMember.user_id == user_id,
-                OrgMember.is_active == True
-            )
+    if team_id is not None:
+        snapshot = await _team_snapshot(team_id, as_of, db)
+        member = snapshot.member_by_user.get(user_id)
+        if not member:
+            raise HTTPException(status_code=404, detail="User not found in this team")
+        if as_of is None and _not_modified(snapshot, response, if_none_match):
+            return Response(status_code=304, headers={"ETag": snapshot.etag})
+
+        managers = snapshot.managers_chain(member.manager_id, max_depth)
+        subordinates = snapshot.subordinates(user_id, max_depth)
+    else:
+        member_res = await db.execute(
+            select(OrgMember).where(
+                and_(
+                    OrgMember.user_id == user_id,
+                    membership_filter(OrgMember, as_of)
+                )
+            ).order_by(OrgMember.id).limit(1)
         )
-    )
-    member = member_res.scalar_one_or_none()
+        member = member_res.scalar_one_or_none()
 
-    if not member:
-        raise HTTPException(status_code=404, detail="User not found in any org unit")
+        if not member:
+            raise HTTPException(status_code=404, detail="User not found in any org unit")
 
-    managers = await get_managers_chain(member.manager_id, db)
+        managers = await get_managers_chain(member.manager_id, db, max_depth, as_of)
 
-    subordinates = await get_subordinates(user_id, db)
+        subordinates = await get_subordinates(user_id, db, max_depth, as_of)
 
     return {
         "managers": managers,
@@ -455,25 +865,201 @@ async def get_user_hierarchy(
     }
 
 
+@router.post("/org_members/is_manager_of", response_model=IsManagerOfOut)
+async def is_manager_of(payload: IsManagerOfRequest, db: AsyncSession = Depends(get_db)):
+    snapshot = await get_org_snapshot(payload.team_id, db)
+    index = snapshot.manager_index
+
+    results = []
+    for pair in payload.pairs:
+        is_manager = index.is_manager_of(pair.manager_id, pair.user_id)
+        results.append({
+            "manager_id": pair.manager_id,
+            "user_id": pair.user_id,
+            "is_manager": is_manager,
+            "is_direct": is_manager and snapshot.member_by_user[pair.user_id].manager_id == pair.manager_id
+        })
+
+    return {"team_id": payload.team_id, "version": snapshot.version, "results": results}
+
+
+@router.get("/org_changes", response_model=OrgChangesOut)
+async def get_org_changes(
+        team_id: int,
+        since: int = Query(0, ge=0, description="Последний примененный клиентом seq"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Дельта оргструктуры после since. Подразделения и членства отдаются в текущем состоянии,
+    поэтому повторное применение безопасно. При resync клиент перечитывает /org_structure/{team_id}
+    и продолжает с seq из заголовка X-Org-Seq ответа: это seq, на котором построен снимок.
+    seq из самого ответа resync для этого не годится - снимок мог быть построен раньше
+    """
+    res = await db.execute(select(Team.org_seq).where(Team.id == team_id))
+    seq = res.scalar_one_or_none()
+    if seq is None:
+        raise HTTPException(status_code=404, detail="Team not found")
+
+    out = {"team_id": team_id, "since": since, "seq": seq}
+    if since == 0 or since > seq or seq - since > ORG_CHANGES_COMPACTION_THRESHOLD:
+        return {**out, "resync": True}
+    if since == seq:
+        return out
+
+    res = await db.execute(
+        select(OrgChange.entity, OrgChange.entity_id)
+        .where(and_(OrgChange.team_id == team_id, OrgChange.seq > since, OrgChange.seq <= seq))
+        .distinct()
+    )
+    changed = {"unit": [], "member": []}
+    for entity, entity_id in res.all():
+        changed[entity].append(entity_id)
+
+    units, members = [], []
+    if changed["unit"]:
+        res = await db.execute(
+            select(OrgUnit).where(OrgUnit.id == any_(bindparam("unit_ids", changed["unit"], type_=ARRAY(Integer))))
+        )
+        units = res.scalars().all()
+    if changed["member"]:
+        res = await db.execute(
+            select(OrgMember).where(
+                OrgMember.id == any_(bindparam("member_ids", changed["member"], type_=ARRAY(Integer)))
+            )
+        )
+        members = res.scalars().all()
+
+    return {
+        **out,
+        "units": [u for u in units if u.is_active],
+        "members": [m for m in members if m.is_active],
+        "deactivated_units": [u.id for u in units if not u.is_active],
+        "deactivated_members": [m.id for m in members if not m.is_active]
+    }
+
+
 @router.get("/team/invites/validate")
 async def validate_invite(
         code: str = Query(..., description="Invite code"),
         db: AsyncSession = Depends(get_db)
 ):
     res = await db.execute(
-        select(Team).where(
-            and_(
-                Team.invite_code == code,
-                Team.is_active == True
-            )
+        select(TeamInvite, Team.name)
+        .join(Team, Team.id == TeamInvite.team_id)
+        .where(and_(TeamInvite.code == code, invite_usable_filter()))
+    )
+    row = res.first()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Invalid invite code")
+
+    invite, team_name = row
+    return {
+        "team_id": invite.team_id,
+        "team_name": team_name,
+        "expires_at": invite.expires_at,
+        "remaining_uses": None if invite.max_uses is None else invite.max_uses - invite.used_count
+    }
+
+
+@router.post("/team/invites/redeem")
+async def redeem_invite(payload: InviteRedeem, db: AsyncSession = Depends(get_db)):
+    """
+    Использование приглашения одним условным UPDATE: проверка лимита и инкремент атомарны,
+    конкурентные запросы на один код не требуют явной блокировки
+    """
+    res = await db.execute(
+        update(TeamInvite)
+        .where(and_(TeamInvite.code == payload.code, invite_usable_filter()))
+        .values(used_count=TeamInvite.used_count + 1)
+        .returning(
+            TeamInvite.team_id,
+            TeamInvite.used_count,
+            TeamInvite.max_uses,
+            select(Team.name).where(Team.id == TeamInvite.team_id).scalar_subquery()
         )
+        .execution_options(synchronize_session=False)
     )
-    team = res.scalar_one_or_none()
+    row = res.first()
+    if not row:
+        await db.rollback()
+        raise await invite_rejection(payload.code, db)
+    await db.commit()
 
+    team_id, used_count, max_uses, team_name = row
+    return {
+        "team_id": team_id,
+        "team_name": team_name,
+        "used_count": used_count,
+        "remaining_uses": None if max_uses is None else max_uses - used_count
+    }
+
+
+@router.post("/teams/{team_id}/invites", response_model=TeamInviteOut)
+async def create_invite(team_id: int, payload: TeamInviteCreate, db: AsyncSession = Depends(get_db)):
+    res = await db.execute(select(Team).where(and_(Team.id == team_id, Team.is_active == True)))
+    team = res.scalar_one_or_none()
     if not team:
-        raise HTTPException(status_code=404, detail="Invalid invite code")
+        raise HTTPException(status_code=404, detail="Team not found")
+
+    expires_at = payload.expires_at
+    if expires_at and expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at and expires_at <= datetime.now(timezone.utc):
+        raise HTTPException(status_code=400, detail="expires_at must be in the future")
+
+    invite = TeamInvite(
+        team_id=team_id,
+        code=secrets.token_urlsafe(8),
+        expires_at=expires_at,
+        max_uses=payload.max_uses,
+        created_by=payload.created_by
+    )
+    db.add(invite)
+    await db.commit()
+    await db.refresh(invite)
+
+    await publish_event("team.invite_created", {
+        "team_id": team_id,
+        "team_name": team.name,
+        "invite_id": invite.id,
+        "invite_code": invite.code,
+        "expires_at": invite.expires_at.isoformat() if invite.expires_at else None,
+        "max_uses": invite.max_uses
+    })
+
+    return invite
+
+
+@router.get("/teams/{team_id}/invites", response_model=List[TeamInviteOut])
+async def get_team_invites(team_id: int, include_inactive: bool = False, db: AsyncSession = Depends(get_db)):
+    query = select(TeamInvite).where(TeamInvite.team_id == team_id)
+    if not include_inactive:
+        query = query.where(TeamInvite.is_active == True)
+    res = await db.execute(query.order_by(TeamInvite.id))
+    return res.scalars().all()
 
-    return {"team_id": team.id, "team_name": team.name}
+
+@router.delete("/team/invites/{invite_id}")
+async def revoke_invite(invite_id: int, db: AsyncSession = Depends(get_db)):
+    res = await db.execute(
+        update(TeamInvite)
+        .where(TeamInvite.id == invite_id)
+        .values(is_active=False)
+        .returning(TeamInvite.team_id, TeamInvite.code)
+    )
+    row = res.first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Invite not found")
+    await db.commit()
+
+    await publish_event("team.invite_revoked", {
+        "team_id": row.team_id,
+        "invite_id": invite_id,
+        "invite_code": row.code
+    })
+
+    return {"message": "Invite revoked successfully"}
 
 
 @router.post("/teams/{team_id}/members")
@@ -506,8 +1092,12 @@ async def add_team_member(
             level=1
         )
         db.add(main_unit)
+        await db.flush()
+        await add_unit_to_closure(main_unit.id, None, db)
+        await record_org_changes(team_id, db, unit_ids=[main_unit.id])
         await db.commit()
         await db.refresh(main_unit)
+        invalidate_org_snapshot(team_id)
 
     existing_res = await db.execute(
         select(OrgMember).where(
@@ -527,8 +1117,12 @@ async def add_team_member(
         position=role
     )
     db.add(member)
+    await apply_headcount_deltas({main_unit.id: 1}, db)
+    await db.flush()
+    await record_org_changes(team_id, db, member_ids=[member.id])
     await db.commit()
     await db.refresh(member)
+    patch_org_members(team_id, upserts=[member_record(member)])
 
     await publish_event("team_member.added", {
         "team_id": team_id,
@@ -572,13 +1166,20 @@ async def remove_team_member(
     if not member:
         raise HTTPException(status_code=404, detail="User not found in this team")
 
-    await db.execute(
-        update(OrgMember).where(OrgMember.id == member.id).values(
-            is_active=False,
-            end_date=func.now()
-        )
+    res = await db.execute(
+        update(OrgMember)
+        .where(and_(OrgMember.id == member.id, OrgMember.is_active == True))
+        .values(is_active=False, end_date=func.now())
+        .returning(OrgMember.org_unit_id)
+        .execution_options(synchronize_session=False)
     )
+    if res.scalar_one_or_none() is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="User not found in this team")
+    await apply_headcount_deltas({member.org_unit_id: -1}, db)
+    await record_org_changes(team_id, db, member_ids=[member.id])
     await db.commit()
+    patch_org_members(team_id, removed_ids=[member.id])
 
     await publish_event("team_member.removed", {
         "team_id": team_id,
@@ -589,9 +1190,39 @@ async def remove_team_member(
     return {"message": "Member removed successfully"}
 
 
+@router.get("/teams/{team_id}/headcount")
+async def get_team_headcount(team_id: int, db: AsyncSession = Depends(get_db)):
+    """Численность по подразделениям из счетчиков org_units, без чтения org_members"""
+    res = await db.execute(
+        select(OrgUnit.id, OrgUnit.parent_id, OrgUnit.direct_count, OrgUnit.subtree_count).where(
+            and_(
+                OrgUnit.team_id == team_id,
+                OrgUnit.is_active == True
+            )
+        )
+    )
+    units = res.all()
+    if not units:
+        raise HTTPException(status_code=404, detail="No organizational units found")
+
+    return {
+        "team_id": team_id,
+        "total_count": sum(u.direct_count for u in units),
+        "units": [
+            {
+                "org_unit_id": u.id,
+                "parent_id": u.parent_id,
+                "direct_count": u.direct_count,
+                "subtree_count": u.subtree_count
+            } for u in units
+        ]
+    }
+
+
 @router.get("/teams/{team_id}/members")
 async def get_team_members(
         team_id: int,
+        as_of: Optional[datetime] = None,
         db: AsyncSession = Depends(get_db)
 ):
     team_res = await db.execute(select(Team).where(Team.id == team_id))
@@ -604,12 +1235,20 @@ async def get_team_members(
         ).where(
             and_(
                 OrgUnit.team_id == team_id,
-                OrgMember.is_active == True
+                membership_filter(OrgMember, as_of)
             )
         )
     )
     members_data = members_res.all()
 
+    if as_of is None:
+        # Текущая численность поддерживается счетчиками org_units
+        total_count = await db.scalar(
+            select(func.coalesce(func.sum(OrgUnit.direct_count), 0)).where(OrgUnit.team_id == team_id)
+        )
+    else:
+        total_count = len(members_data)
+
     members = []
     for member, unit in members_data:
         members.append({
@@ -626,5 +1265,5 @@ async def get_team_members(
     return {
         "team_id": team_id,
         "members": members,
-        "total_count": len(members)
+        "total_count": total_count
     }
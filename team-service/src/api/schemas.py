@@ -1,6 +1,7 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
 from datetime import datetime
+from src.config import BATCH_GET_MAX_IDS, ORG_MEMBER_BULK_MAX_ROWS
 
 
 class TeamCreate(BaseModel):
@@ -27,6 +28,29 @@ class TeamOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TeamInviteCreate(BaseModel):
+    expires_at: Optional[datetime] = None
+    max_uses: Optional[int] = Field(None, gt=0)
+    created_by: Optional[int] = None
+
+
+class TeamInviteOut(BaseModel):
+    id: int
+    team_id: int
+    code: str
+    expires_at: Optional[datetime]
+    max_uses: Optional[int]
+    used_count: int
+    is_active: bool
+    created_by: Optional[int]
+    created_at: datetime
+    model_config = ConfigDict(from_attributes=True)
+
+
+class InviteRedeem(BaseModel):
+    code: str
+
+
 class OrgUnitCreate(BaseModel):
     team_id: int
     name: str
@@ -39,8 +63,10 @@ class OrgUnitUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
     parent_id: Optional[int] = None
-    level: Optional[int] = None
-    is_active: Optional[bool] = None
+
+
+class OrgUnitMove(BaseModel):
+    parent_id: Optional[int] = None
 
 
 class OrgUnitOut(BaseModel):
@@ -50,6 +76,8 @@ class OrgUnitOut(BaseModel):
     parent_id: Optional[int]
     description: Optional[str]
     level: int
+    direct_count: int
+    subtree_count: int
     is_active: bool
     created_at: datetime
     updated_at: Optional[datetime]
@@ -70,6 +98,33 @@ class OrgMemberUpdate(BaseModel):
     end_date: Optional[datetime] = None
 
 
+class OrgMemberPlacement(BaseModel):
+    user_id: int
+    org_unit_id: int
+    position: Optional[str] = None
+    manager_id: Optional[int] = None
+
+
+class ManagerEdge(BaseModel):
+    user_id: int
+    manager_id: Optional[int] = None
+
+
+class OrgMemberBulkRequest(BaseModel):
+    team_id: int
+    placements: List[OrgMemberPlacement] = Field(default_factory=list, max_length=ORG_MEMBER_BULK_MAX_ROWS)
+    managers: List[ManagerEdge] = Field(default_factory=list, max_length=ORG_MEMBER_BULK_MAX_ROWS)
+    # Закрыть прочие членства пользователя в команде при размещении в новом подразделении
+    move_existing: bool = True
+
+
+class OrgMemberBulkOut(BaseModel):
+    team_id: int
+    added: int
+    updated: int
+    removed: int
+
+
 class OrgMemberOut(BaseModel):
     id: int
     user_id: int
@@ -83,6 +138,18 @@ class OrgMemberOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class OrgChangesOut(BaseModel):
+    team_id: int
+    since: int
+    seq: int
+    # Дельта недоступна (компактирована или клиент без состояния) - перечитать /org_structure
+    resync: bool = False
+    units: List[OrgUnitOut] = Field(default_factory=list)
+    members: List[OrgMemberOut] = Field(default_factory=list)
+    deactivated_units: List[int] = Field(default_factory=list)
+    deactivated_members: List[int] = Field(default_factory=list)
+
+
 class TeamNewsCreate(BaseModel):
     team_id: int
     author_id: int
@@ -103,7 +170,76 @@ class TeamNewsOut(BaseModel):
     author_id: int
     title: str
     content: str
+    excerpt: Optional[str] = None
     is_published: bool
     created_at: datetime
     updated_at: Optional[datetime]
     model_config = ConfigDict(from_attributes=True)
+
+
+class TeamNewsSummary(BaseModel):
+    id: int
+    team_id: int
+    author_id: int
+    title: str
+    excerpt: Optional[str]
+    created_at: datetime
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TeamNewsFeedOut(BaseModel):
+    items: List[TeamNewsSummary]
+    next_cursor: Optional[str] = None
+
+
+class NewsMarkRead(BaseModel):
+    team_id: int
+    news_ids: List[int] = Field(default_factory=list, max_length=BATCH_GET_MAX_IDS)
+    all: bool = False
+
+
+class NewsUnreadOut(BaseModel):
+    team_id: int
+    unread_count: int
+    last_read_seq: int
+
+
+class NewsSearchHit(TeamNewsSummary):
+    rank: float
+    title_highlight: str
+    content_highlight: str
+
+
+class NewsSearchOut(BaseModel):
+    items: List[NewsSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+
+class TeamBatchOut(BaseModel):
+    items: List[TeamOut]
+    missing: List[int]
+
+
+class ManagerPair(BaseModel):
+    manager_id: int
+    user_id: int
+
+
+class IsManagerOfRequest(BaseModel):
+    team_id: int
+    pairs: List[ManagerPair] = Field(..., min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+
+class IsManagerOfResult(ManagerPair):
+    is_manager: bool
+    is_direct: bool
+
+
+class IsManagerOfOut(BaseModel):
+    team_id: int
+    version: int
+    results: List[IsManagerOfResult]
@@ -1,100 +1,593 @@
-from typing import Optional
-from sqlalchemy import select, and_
+import base64
+import json
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import (
+    select, update, delete, insert, and_, or_, literal, all_, exists, func, bindparam, cast, join, true,
+    Integer, String, DateTime, Float
+)
+from sqlalchemy.dialects.postgresql import array, ARRAY
+from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.db.models import OrgMember, OrgUnit
+from fastapi import HTTPException
+from src.config import (
+    ORG_HIERARCHY_MAX_DEPTH, NEWS_EXCERPT_LENGTH, TEAM_DEACTIVATION_CHUNK_SIZE, ORG_CHANGES_COMPACTION_THRESHOLD
+)
+from src.db.models import Team, TeamInvite, OrgChange, OrgMember, OrgUnit, OrgUnitClosure, TeamNews
 
 
-async def get_managers_chain(manager_id: Optional[int], db: AsyncSession) -> list:
+def invite_usable_filter():
+    """Приглашение можно использовать: активно, не истекло, лимит не исчерпан, команда активна"""
+    return and_(
+        TeamInvite.is_active == True,
+        or_(TeamInvite.expires_at.is_(None), TeamInvite.expires_at > func.now()),
+        or_(TeamInvite.max_uses.is_(None), TeamInvite.used_count < TeamInvite.max_uses),
+        exists().where(and_(Team.id == TeamInvite.team_id, Team.is_active == True))
+    )
+
+
+async def invite_rejection(code: str, db: AsyncSession) -> HTTPException:
+    """Причина отказа - только на холодном пути, после неудачного условного UPDATE"""
+    res = await db.execute(
+        select(TeamInvite, Team.is_active)
+        .join(Team, Team.id == TeamInvite.team_id)
+        .where(TeamInvite.code == code)
+    )
+    row = res.first()
+    if not row or not row[0].is_active or not row[1]:
+        return HTTPException(status_code=404, detail="Invalid invite code")
+    invite = row[0]
+    if invite.expires_at is not None and invite.expires_at <= datetime.now(timezone.utc):
+        return HTTPException(status_code=410, detail="Invite code expired")
+    return HTTPException(status_code=410, detail="Invite code usage limit reached")
+
+
+def membership_filter(member=OrgMember, as_of: Optional[datetime] = None):
+    """
+    Действующее членство: текущее (is_active) или на момент as_of.
+    Исторический вариант совпадает с выражением GiST-индекса ix_org_members_validity
+    """
+    if as_of is None:
+        return member.is_active == True
+    if as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+    return and_(
+        func.tstzrange(member.start_date, member.end_date).op("@>")(literal(as_of, DateTime(timezone=True))),
+        # Старые записи, деактивированные без end_date, в истории не участвуют
+        or_(member.is_active == True, member.end_date.isnot(None))
+    )
+
+
+def unit_filter(as_of: Optional[datetime] = None):
+    """
+    Подразделения на момент as_of: созданные раньше и не деактивированные до него.
+    Иерархия (parent_id) истории не имеет - берется текущая
+    """
+    if as_of is None:
+        return OrgUnit.is_active == True
+    if as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+    return and_(
+        OrgUnit.created_at <= as_of,
+        or_(OrgUnit.is_active == True, OrgUnit.deactivated_at > as_of)
+    )
+
+
+async def get_managers_chain(manager_id: Optional[int], db: AsyncSession,
+                             max_depth: int = ORG_HIERARCHY_MAX_DEPTH, as_of: Optional[datetime] = None) -> list:
+    """Цепочка руководителей одним WITH RECURSIVE; path защищает от циклов в manager_id"""
     if not manager_id:
         return []
 
-    member_res = await db.execute(
-        select(OrgMember).where(
+    chain = (
+        select(
+            OrgMember.user_id,
+            OrgMember.position,
+            OrgMember.org_unit_id,
+            OrgMember.manager_id,
+            literal(1).label("depth"),
+            array([OrgMember.user_id]).label("path")
+        )
+        .where(
             and_(
                 OrgMember.user_id == manager_id,
-                OrgMember.is_active == True
+                membership_filter(OrgMember, as_of)
+            )
+        )
+        .cte("managers_chain", recursive=True)
+    )
+    manager = aliased(OrgMember)
+    chain = chain.union_all(
+        select(
+            manager.user_id,
+            manager.position,
+            manager.org_unit_id,
+            manager.manager_id,
+            chain.c.depth + 1,
+            chain.c.path.op("||")(manager.user_id)
+        )
+        .join(chain, manager.user_id == chain.c.manager_id)
+        .where(
+            and_(
+                membership_filter(manager, as_of),
+                manager.user_id != all_(chain.c.path),
+                chain.c.depth < max_depth
             )
         )
     )
-    manager = member_res.scalar_one_or_none()
-
-    if not manager:
-        return []
-
-    chain = [{
-        "user_id": manager.user_id,
-        "position": manager.position,
-        "org_unit_id": manager.org_unit_id
-    }]
 
-    if manager.manager_id:
-        chain.extend(await get_managers_chain(manager.manager_id, db))
+    res = await db.execute(
+        select(chain.c.user_id, chain.c.position, chain.c.org_unit_id).order_by(chain.c.depth)
+    )
 
-    return chain
+    result = []
+    seen = set()
+    for row in res.all():
+        if row.user_id in seen:
+            continue
+        seen.add(row.user_id)
+        result.append({
+            "user_id": row.user_id,
+            "position": row.position,
+            "org_unit_id": row.org_unit_id
+        })
+    return result
 
 
-async def get_subordinates(user_id: int, db: AsyncSession) -> list:
-    subs_res = await db.execute(
-        select(OrgMember).where(
+async def get_subordinates(user_id: int, db: AsyncSession,
+                           max_depth: int = ORG_HIERARCHY_MAX_DEPTH, as_of: Optional[datetime] = None) -> list:
+    """Все подчиненные одним WITH RECURSIVE, вложенное дерево собирается за O(n)"""
+    subs = (
+        select(
+            OrgMember.user_id,
+            OrgMember.position,
+            OrgMember.org_unit_id,
+            OrgMember.manager_id,
+            literal(1).label("depth"),
+            array([literal(user_id), OrgMember.user_id]).label("path")
+        )
+        .where(
             and_(
                 OrgMember.manager_id == user_id,
-                OrgMember.is_active == True
+                membership_filter(OrgMember, as_of),
+                OrgMember.user_id != user_id
+            )
+        )
+        .cte("subordinates", recursive=True)
+    )
+    sub = aliased(OrgMember)
+    subs = subs.union_all(
+        select(
+            sub.user_id,
+            sub.position,
+            sub.org_unit_id,
+            sub.manager_id,
+            subs.c.depth + 1,
+            subs.c.path.op("||")(sub.user_id)
+        )
+        .join(subs, sub.manager_id == subs.c.user_id)
+        .where(
+            and_(
+                membership_filter(sub, as_of),
+                sub.user_id != all_(subs.c.path),
+                subs.c.depth < max_depth
             )
         )
     )
-    subordinates = subs_res.scalars().all()
 
-    result = []
-    for sub in subordinates:
-        sub_data = {
-            "user_id": sub.user_id,
-            "position": sub.position,
-            "org_unit_id": sub.org_unit_id,
-            "subordinates": await get_subordinates(sub.user_id, db)
+    res = await db.execute(
+        select(subs.c.user_id, subs.c.position, subs.c.org_unit_id, subs.c.manager_id)
+        .order_by(subs.c.depth, subs.c.user_id)
+    )
+
+    nodes = {user_id: {"subordinates": []}}
+    for row in res.all():
+        if row.user_id in nodes:
+            continue
+        node = {
+            "user_id": row.user_id,
+            "position": row.position,
+            "org_unit_id": row.org_unit_id,
+            "subordinates": []
         }
-        result.append(sub_data)
+        nodes[row.user_id] = node
+        nodes[row.manager_id]["subordinates"].append(node)
 
-    return result
+    return nodes[user_id]["subordinates"]
+
+
+def build_org_tree(units: list, members: list, max_depth: int) -> list:
+    """Дерево подразделений из заранее загруженных units и members, без рекурсии и запросов к БД"""
+    children_by_parent = defaultdict(list)
+    for unit in units:
+        children_by_parent[unit.parent_id].append(unit)
+
+    members_by_unit = defaultdict(list)
+    for m in members:
+        members_by_unit[m.org_unit_id].append({
+            "user_id": m.user_id,
+            "position": m.position,
+            "manager_id": m.manager_id,
+            "start_date": m.start_date
+        })
+
+    org_tree = []
+    stack = [(unit, 1, org_tree) for unit in reversed([u for u in units if u.level == 1])]
+    while stack:
+        unit, current_depth, siblings = stack.pop()
+        if current_depth > max_depth:
+            continue
+
+        unit_data = {
+            "id": unit.id,
+            "name": unit.name,
+            "level": unit.level,
+            "description": unit.description,
+            "direct_count": unit.direct_count,
+            "subtree_count": unit.subtree_count,
+            "members": members_by_unit.get(unit.id, []),
+            "children": []
+        }
+        siblings.append(unit_data)
+
+        for child in reversed(children_by_parent.get(unit.id, [])):
+            stack.append((child, current_depth + 1, unit_data["children"]))
+
+    return org_tree
+
+
+def subtree_unit_ids(unit_id: int):
+    """Подзапрос id всех подразделений поддерева, включая сам unit_id"""
+    return select(OrgUnitClosure.descendant_id).where(OrgUnitClosure.ancestor_id == unit_id)
+
+
+async def is_unit_ancestor(ancestor_id: int, unit_id: int, db: AsyncSession) -> bool:
+    res = await db.execute(
+        select(
+            exists().where(
+                and_(
+                    OrgUnitClosure.ancestor_id == ancestor_id,
+                    OrgUnitClosure.descendant_id == unit_id
+                )
+            )
+        )
+    )
+    return res.scalar()
+
+
+async def add_unit_to_closure(unit_id: int, parent_id: Optional[int], db: AsyncSession):
+    """Строки замыкания для нового листа: (unit, unit, 0) и все предки родителя со сдвигом глубины"""
+    rows = select(literal(unit_id), literal(unit_id), literal(0))
+    if parent_id:
+        rows = rows.union_all(
+            select(OrgUnitClosure.ancestor_id, literal(unit_id), OrgUnitClosure.depth + 1)
+            .where(OrgUnitClosure.descendant_id == parent_id)
+        )
+    await db.execute(
+        insert(OrgUnitClosure).from_select(["ancestor_id", "descendant_id", "depth"], rows)
+    )
+
+
+async def move_unit_subtree(unit: OrgUnit, new_parent: Optional[OrgUnit], db: AsyncSession) -> List[int]:
+    """
+    Перенос поддерева под new_parent: связи поддерева со старыми предками удаляются,
+    с новыми - создаются одним INSERT ... SELECT, уровни пересчитываются одним UPDATE
+    """
+    old_ancestors = select(OrgUnitClosure.ancestor_id).where(
+        and_(
+            OrgUnitClosure.descendant_id == unit.id,
+            OrgUnitClosure.ancestor_id != unit.id
+        )
+    )
+    # Блокировка корня поддерева сериализует перенос с изменениями численности внутри него
+    count_res = await db.execute(
+        select(OrgUnit.subtree_count).where(OrgUnit.id == unit.id).with_for_update()
+    )
+    moved_count = count_res.scalar_one()
+    if moved_count:
+        await db.execute(
+            update(OrgUnit)
+            .where(OrgUnit.id.in_(old_ancestors))
+            .values(subtree_count=OrgUnit.subtree_count - moved_count, updated_at=OrgUnit.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+
+    await db.execute(
+        delete(OrgUnitClosure).where(
+            and_(
+                OrgUnitClosure.descendant_id.in_(subtree_unit_ids(unit.id)),
+                OrgUnitClosure.ancestor_id.in_(old_ancestors)
+            )
+        )
+    )
+
+    if new_parent:
+        ancestor = aliased(OrgUnitClosure)
+        descendant = aliased(OrgUnitClosure)
+        await db.execute(
+            insert(OrgUnitClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(
+                    ancestor.ancestor_id,
+                    descendant.descendant_id,
+                    ancestor.depth + descendant.depth + 1
+                ).select_from(
+                    # Декартово произведение предков нового родителя и узлов поддерева
+                    join(ancestor, descendant, true())
+                ).where(
+                    and_(
+                        ancestor.descendant_id == new_parent.id,
+                        descendant.ancestor_id == unit.id
+                    )
+                )
+            )
+        )
+
+        if moved_count:
+            await db.execute(
+                update(OrgUnit)
+                .where(
+                    OrgUnit.id.in_(
+                        select(OrgUnitClosure.ancestor_id).where(OrgUnitClosure.descendant_id == new_parent.id)
+                    )
+                )
+                .values(subtree_count=OrgUnit.subtree_count + moved_count, updated_at=OrgUnit.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+
+    base_level = new_parent.level + 1 if new_parent else 1
+    res = await db.execute(
+        update(OrgUnit)
+        .where(
+            and_(
+                OrgUnit.id == OrgUnitClosure.descendant_id,
+                OrgUnitClosure.ancestor_id == unit.id
+            )
+        )
+        .values(level=base_level + OrgUnitClosure.depth)
+        .returning(OrgUnit.id)
+        .execution_options(synchronize_session=False)
+    )
+    moved_ids = res.scalars().all()
 
+    await db.execute(
+        update(OrgUnit)
+        .where(OrgUnit.id == unit.id)
+        .values(parent_id=new_parent.id if new_parent else None)
+        .execution_options(synchronize_session=False)
+    )
+    return moved_ids
 
-async def build_unit_tree(unit: OrgUnit, all_units: list, max_depth: int, db: AsyncSession,
-                          current_depth: int = 1) -> dict:
-    if current_depth > max_depth:
-        return None
 
-    members_res = await db.execute(
-        select(OrgMember).where(
+async def deactivate_unit_subtree(unit_id: int, db: AsyncSession) -> Tuple[List[int], List[int]]:
+    """
+    Деактивация поддерева вместе с его членствами в той же транзакции,
+    счетчики предков уменьшаются через apply_headcount_deltas.
+    Возвращает id деактивированных подразделений и закрытых членств
+    """
+    res = await db.execute(
+        update(OrgUnit)
+        .where(
             and_(
-                OrgMember.org_unit_id == unit.id,
-                OrgMember.is_active == True
+                OrgUnit.id.in_(subtree_unit_ids(unit_id)),
+                OrgUnit.is_active == True
             )
         )
+        .values(is_active=False, deactivated_at=func.now())
+        .returning(OrgUnit.id)
+        .execution_options(synchronize_session=False)
+    )
+    unit_ids = res.scalars().all()
+
+    subtree_members = OrgMember.org_unit_id.in_(subtree_unit_ids(unit_id))
+    # Заблокированные участники не должны вернуться в закрытое подразделение при активации
+    await db.execute(
+        update(OrgMember)
+        .where(and_(subtree_members, OrgMember.suspended_at.isnot(None)))
+        .values(suspended_at=None)
+        .execution_options(synchronize_session=False)
     )
-    members = members_res.scalars().all()
+    res = await db.execute(
+        update(OrgMember)
+        .where(and_(subtree_members, OrgMember.is_active == True))
+        .values(is_active=False, end_date=func.now())
+        .returning(OrgMember.id, OrgMember.org_unit_id)
+        .execution_options(synchronize_session=False)
+    )
+    rows = res.all()
+    await apply_headcount_deltas({unit: -count for unit, count in Counter(r[1] for r in rows).items()}, db)
+    return unit_ids, [r[0] for r in rows]
+
+
+async def deactivate_team_cascade(
+        team_id: int,
+        db: AsyncSession,
+        chunk_size: int = TEAM_DEACTIVATION_CHUNK_SIZE
+) -> Tuple[List[int], int]:
+    """
+    Каскадная деактивация содержимого команды пачками по chunk_size строк.
+    Каждая пачка - отдельная транзакция, чтобы не держать блокировки на всю команду;
+    повторный вызов продолжает с места остановки
+    """
+    team_units = select(OrgUnit.id).where(OrgUnit.team_id == team_id)
+    # Заблокированные участники не должны вернуться в команду при активации
+    await db.execute(
+        update(OrgMember)
+        .where(and_(OrgMember.org_unit_id.in_(team_units), OrgMember.suspended_at.isnot(None)))
+        .values(suspended_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+    members_deactivated = 0
+    while True:
+        batch = (
+            select(OrgMember.id)
+            .where(and_(OrgMember.org_unit_id.in_(team_units), OrgMember.is_active == True))
+            .order_by(OrgMember.id)
+            .limit(chunk_size)
+        )
+        res = await db.execute(
+            update(OrgMember)
+            .where(OrgMember.id.in_(batch))
+            .values(is_active=False, end_date=func.now())
+            .returning(OrgMember.id, OrgMember.org_unit_id)
+            .execution_options(synchronize_session=False)
+        )
+        rows = res.all()
+        if not rows:
+            break
+        await apply_headcount_deltas({unit_id: -count for unit_id, count in Counter(r[1] for r in rows).items()}, db)
+        await record_org_changes(team_id, db, member_ids=[r[0] for r in rows])
+        await db.commit()
+        members_deactivated += len(rows)
+
+    deactivated_units = []
+    while True:
+        batch = (
+            select(OrgUnit.id)
+            .where(and_(OrgUnit.team_id == team_id, OrgUnit.is_active == True))
+            .order_by(OrgUnit.id)
+            .limit(chunk_size)
+        )
+        res = await db.execute(
+            update(OrgUnit)
+            .where(OrgUnit.id.in_(batch))
+            .values(is_active=False, deactivated_at=func.now())
+            .returning(OrgUnit.id)
+            .execution_options(synchronize_session=False)
+        )
+        unit_ids = res.scalars().all()
+        await record_org_changes(team_id, db, unit_ids=unit_ids)
+        await db.commit()
+        if not unit_ids:
+            break
+        deactivated_units.extend(unit_ids)
+
+    return deactivated_units, members_deactivated
 
-    children = [u for u in all_units if u.parent_id == unit.id]
 
-    unit_data = {
-        "id": unit.id,
-        "name": unit.name,
-        "level": unit.level,
-        "description": unit.description,
-        "members": [
-            {
-                "user_id": m.user_id,
-                "position": m.position,
-                "manager_id": m.manager_id,
-                "start_date": m.start_date
-            } for m in members
-        ],
-        "children": []
-    }
+async def record_org_changes(
+        team_id: Optional[int],
+        db: AsyncSession,
+        unit_ids: Iterable[int] = (),
+        member_ids: Iterable[int] = ()
+):
+    """
+    Запись в журнал org_changes. Номера выдаются инкрементом teams.org_seq: строка команды
+    заблокирована до коммита, поэтому seq растут в порядке коммитов и читатель не пропустит запись.
+    Вызывать последним перед commit, чтобы блокировка держалась минимально.
+    Журнал компактируется до ORG_CHANGES_COMPACTION_THRESHOLD последних записей команды
+    """
+    entries = [("unit", i) for i in dict.fromkeys(unit_ids)] + [("member", i) for i in dict.fromkeys(member_ids)]
+    if team_id is None or not entries:
+        return
 
-    for child in children:
-        child_tree = await build_unit_tree(
-            child, all_units, max_depth, db, current_depth + 1
+    res = await db.execute(
+        update(Team)
+        .where(Team.id == team_id)
+        .values(org_seq=Team.org_seq + len(entries), updated_at=Team.updated_at)
+        .returning(Team.org_seq)
+    )
+    last_seq = res.scalar_one_or_none()
+    if last_seq is None:
+        return
+
+    entities, entity_ids = zip(*entries)
+    rows = select(
+        literal(team_id, Integer),
+        func.unnest(bindparam("seqs", list(range(last_seq - len(entries) + 1, last_seq + 1)), type_=ARRAY(Integer))),
+        func.unnest(bindparam("entities", list(entities), type_=ARRAY(String))),
+        func.unnest(bindparam("entity_ids", list(entity_ids), type_=ARRAY(Integer)))
+    )
+    await db.execute(insert(OrgChange).from_select(["team_id", "seq", "entity", "entity_id"], rows))
+    if last_seq > ORG_CHANGES_COMPACTION_THRESHOLD:
+        await db.execute(
+            delete(OrgChange).where(
+                and_(OrgChange.team_id == team_id, OrgChange.seq <= last_seq - ORG_CHANGES_COMPACTION_THRESHOLD)
+            )
         )
-        if child_tree:
-            unit_data["children"].append(child_tree)
 
-    return unit_data
+
+async def apply_headcount_deltas(deltas: Dict[int, int], db: AsyncSession):
+    """
+    Изменение численности: direct_count у самих подразделений,
+    subtree_count у всех их предков по closure - два UPDATE на любой объем изменений
+    """
+    deltas = {unit_id: delta for unit_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    changes = select(
+        func.unnest(bindparam("unit_ids", list(deltas), type_=ARRAY(Integer))).label("unit_id"),
+        func.unnest(bindparam("deltas", list(deltas.values()), type_=ARRAY(Integer))).label("delta")
+    ).subquery("changes")
+    await db.execute(
+        update(OrgUnit)
+        .where(OrgUnit.id == changes.c.unit_id)
+        .values(direct_count=OrgUnit.direct_count + changes.c.delta, updated_at=OrgUnit.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+    rollup = (
+        select(OrgUnitClosure.ancestor_id, func.sum(changes.c.delta).label("delta"))
+        .join(changes, OrgUnitClosure.descendant_id == changes.c.unit_id)
+        .group_by(OrgUnitClosure.ancestor_id)
+        .subquery("rollup")
+    )
+    await db.execute(
+        update(OrgUnit)
+        .where(OrgUnit.id == rollup.c.ancestor_id)
+        .values(subtree_count=OrgUnit.subtree_count + rollup.c.delta, updated_at=OrgUnit.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def make_excerpt(content: str, length: int = NEWS_EXCERPT_LENGTH) -> str:
+    """Фрагмент для ленты: пробелы схлопываются, обрезка по границе слова"""
+    text = _WHITESPACE.sub(" ", content).strip()
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if " " in cut[length // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip() + "…"
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+NEWS_SEARCH_CONFIGS = {"ru": ("russian",), "en": ("english",), "auto": ("russian", "english")}
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10"
+TITLE_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, HighlightAll=true"
+
+
+def news_search_clauses(q: str, lang: str = "auto"):
+    """tsquery по выбранным конфигурациям, условие совпадения и ранг"""
+    configs = NEWS_SEARCH_CONFIGS[lang]
+    tsquery = func.websearch_to_tsquery(configs[0], q)
+    for config in configs[1:]:
+        tsquery = tsquery.op("||")(func.websearch_to_tsquery(config, q))
+    condition = TeamNews.search_vector.op("@@")(tsquery)
+    rank = cast(func.ts_rank_cd(TeamNews.search_vector, tsquery), Float)
+    return tsquery, condition, rank
+
+
+def news_headline(config: str, column, tsquery, options: str = HEADLINE_OPTIONS):
+    return func.ts_headline(config, column, tsquery, options)
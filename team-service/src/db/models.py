@@ -1,6 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
-from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index, CheckConstraint, Computed, LargeBinary
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.sql import func, text
+from sqlalchemy.orm import relationship, deferred
 from src.db.database import Base
 
 
@@ -12,10 +15,31 @@ class Team(Base):
     owner_id = Column(Integer, nullable=True)
     invite_code = Column(String, unique=True, nullable=True)
     is_active = Column(Boolean, default=True)
+    # Последний выданный порядковый номер новости команды
+    news_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    # Последний номер в журнале изменений оргструктуры команды
+    org_seq = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+class TeamInvite(Base):
+    """Приглашение в команду; Team.invite_code дублируется сюда как бессрочный код без лимита"""
+    __tablename__ = "team_invites"
+    id = Column(Integer, primary_key=True, index=True)
+    team_id = Column(Integer, nullable=False, index=True)
+    code = Column(String, unique=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+    max_uses = Column(Integer, nullable=True)
+    used_count = Column(Integer, nullable=False, default=0, server_default="0")
+    is_active = Column(Boolean, nullable=False, default=True, server_default=text("true"))
+    created_by = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    __table_args__ = (
+        CheckConstraint("max_uses IS NULL OR used_count <= max_uses", name="ck_team_invites_uses"),
+    )
+
+
 class OrgUnit(Base):
     __tablename__ = "org_units"
     id = Column(Integer, primary_key=True, index=True)
@@ -24,9 +48,38 @@ class OrgUnit(Base):
     parent_id = Column(Integer, nullable=True)
     description = Column(Text, nullable=True)
     level = Column(Integer, default=1)
+    # Активные членства в самом подразделении и во всем поддереве (по closure, без учета is_active подразделений)
+    direct_count = Column(Integer, nullable=False, default=0, server_default="0")
+    subtree_count = Column(Integer, nullable=False, default=0, server_default="0")
     is_active = Column(Boolean, default=True)
+    # Момент деактивации для исторических запросов; updated_at меняют и переименования, и счетчики
+    deactivated_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    __table_args__ = (
+        Index("ix_org_units_team_id_active", "team_id", postgresql_where=text("is_active")),
+    )
+
+
+class OrgUnitClosure(Base):
+    """Транзитивное замыкание иерархии org_units: строка на каждую пару (предок, потомок), включая (x, x)"""
+    __tablename__ = "org_unit_closure"
+    ancestor_id = Column(Integer, primary_key=True)
+    descendant_id = Column(Integer, primary_key=True)
+    depth = Column(Integer, nullable=False)
+    __table_args__ = (
+        Index("ix_org_unit_closure_descendant", "descendant_id", "ancestor_id"),
+    )
+
+
+class OrgChange(Base):
+    """Журнал изменений оргструктуры: какие подразделения и членства менялись на шаге seq команды"""
+    __tablename__ = "org_changes"
+    team_id = Column(Integer, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class OrgMember(Base):
@@ -39,7 +92,28 @@ class OrgMember(Base):
     is_active = Column(Boolean, default=True)
     start_date = Column(DateTime(timezone=True), server_default=func.now())
     end_date = Column(DateTime(timezone=True), nullable=True)
+    # Членство закрыто блокировкой пользователя и восстанавливается при его активации
+    suspended_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    __table_args__ = (
+        CheckConstraint("end_date IS NULL OR end_date >= start_date", name="ck_org_members_validity"),
+        Index("ix_org_members_user_id_is_active", "user_id", "is_active"),
+        Index("ix_org_members_org_unit_id_is_active", "org_unit_id", "is_active"),
+        Index("ix_org_members_manager_id_active", "manager_id", postgresql_where=text("is_active")),
+        Index(
+            "ix_org_members_validity",
+            func.tstzrange(start_date, end_date),
+            postgresql_using="gist"
+        ),
+    )
+
+
+NEWS_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(content, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+)
 
 
 class TeamNews(Base):
@@ -47,8 +121,48 @@ class TeamNews(Base):
     id = Column(Integer, primary_key=True, index=True)
     team_id = Column(Integer, nullable=False)
     author_id = Column(Integer, nullable=False)
+    # Порядковый номер в команде, выдается при первой публикации; у черновиков NULL
+    seq = Column(Integer, nullable=True)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
+    # Короткий фрагмент content для ленты, считается при записи
+    excerpt = Column(Text, nullable=True)
     is_published = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Контент двуязычный: индексируем и русской, и английской конфигурацией, заголовок весомее текста
+    search_vector = deferred(Column(TSVECTOR, Computed(NEWS_SEARCH_VECTOR_SQL, persisted=True)))
+    __table_args__ = (
+        Index("ix_team_news_search", "search_vector", postgresql_using="gin"),
+        Index("ix_team_news_team_seq", "team_id", "seq", unique=True),
+        Index(
+            "ix_team_news_team_feed",
+            "team_id", created_at.desc(), id.desc(),
+            postgresql_where=text("is_published")
+        ),
+    )
+
+
+class NewsReadState(Base):
+    """
+    Прочитанные новости пользователя в команде: все seq <= watermark прочитаны,
+    выше - битовая карта (бит j = seq watermark + 1 + j), сжатая zlib
+    """
+    __tablename__ = "news_read_states"
+    user_id = Column(Integer, primary_key=True)
+    team_id = Column(Integer, primary_key=True)
+    watermark = Column(Integer, nullable=False, default=0, server_default="0")
+    bitmap = Column(LargeBinary, nullable=False, default=b"", server_default="")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class TokenRevocation(Base):
+    """Отзыв токенов для восстановления списка отзыва после рестарта; jti пустой - отозваны все токены user_id"""
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=True)
+    jti = Column(String, nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -6,6 +6,7 @@ from src.db.models import Team, OrgUnit, OrgMember, TeamNews
 from sqladmin import Admin, ModelView
 
 from src.services.event_consumers import setup_team_consumers
+from src.services.revocation_store import sync_revocations
 
 app = FastAPI(title="Team Service", version="1.0.0")
 app.include_router(router, prefix="/api")
@@ -14,6 +15,7 @@ admin = Admin(app, engine)
 
 @app.on_event("startup")
 async def startup_event():
+    asyncio.create_task(sync_revocations())
     asyncio.create_task(setup_team_consumers())
 
 
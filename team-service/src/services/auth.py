@@ -0,0 +1,176 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt, ExpiredSignatureError, JWTError
+from src.config import (
+    JWT_SECRET, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, TOKEN_CACHE_SIZE, REVOCATION_BLOOM_CAPACITY
+)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+
+
+class RevocationList:
+    """
+    Bloom-фильтр отвечает "точно не отозван" без обращения к словарям;
+    только при срабатывании фильтра проверяем точные записи
+    """
+
+    def __init__(self, capacity: int, retention_seconds: float):
+        self.bloom = BloomFilter(capacity)
+        self.retention_seconds = retention_seconds
+        self.subjects: Dict[str, int] = {}
+        self.tokens: Dict[str, float] = {}
+
+    def revoke_subject(self, subject, revoked_at: Optional[float] = None):
+        """
+        Отзывает все токены пользователя, выданные не позже revoked_at.
+        iat в токене целый, поэтому момент отзыва тоже хранится с точностью до секунды
+        """
+        subject = str(subject)
+        self.subjects[subject] = max(int(revoked_at or time.time()), self.subjects.get(subject, 0))
+        self.bloom.add(f"sub:{subject}")
+
+    def revoke_token(self, jti: str, expires_at: float):
+        self.tokens[jti] = expires_at
+        self.bloom.add(f"jti:{jti}")
+
+    def is_revoked(self, claims: dict) -> bool:
+        subject = str(claims.get("sub"))
+        if f"sub:{subject}" in self.bloom:
+            revoked_at = self.subjects.get(subject)
+            if revoked_at is not None and revoked_at >= int(claims.get("iat", 0)):
+                return True
+
+        jti = claims.get("jti")
+        if jti and f"jti:{jti}" in self.bloom and jti in self.tokens:
+            return True
+        return False
+
+    def purge(self):
+        """Удаляет записи, после которых все затронутые токены уже истекли, и пересобирает фильтр"""
+        now = time.time()
+        self.subjects = {
+            s: at for s, at in self.subjects.items() if at + self.retention_seconds > now
+        }
+        self.tokens = {jti: exp for jti, exp in self.tokens.items() if exp > now}
+        self.bloom.clear()
+        for subject in self.subjects:
+            self.bloom.add(f"sub:{subject}")
+        for jti in self.tokens:
+            self.bloom.add(f"jti:{jti}")
+
+
+revocations = RevocationList(REVOCATION_BLOOM_CAPACITY, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+_claims_cache: "OrderedDict[str, dict]" = OrderedDict()
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def _verify_token(token: str) -> dict:
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"require_exp": True})
+    except ExpiredSignatureError:
+        raise ValueError("Token expired")
+    except JWTError:
+        raise ValueError("Invalid token")
+
+
+def decode_token(token: str) -> dict:
+    """Проверка подписи с мемоизацией claims до истечения токена"""
+    claims = _claims_cache.get(token)
+    if claims is not None:
+        if claims["exp"] > time.time():
+            _claims_cache.move_to_end(token)
+            return claims
+        del _claims_cache[token]
+
+    claims = _verify_token(token)
+    _claims_cache[token] = claims
+    if len(_claims_cache) > TOKEN_CACHE_SIZE:
+        _claims_cache.popitem(last=False)
+    return claims
+
+
+async def get_current_claims(
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> dict:
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        claims = decode_token(credentials.credentials)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+    if revocations.is_revoked(claims):
+        raise HTTPException(status_code=401, detail="Token revoked", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+
+async def get_current_user_id(claims: dict = Depends(get_current_claims)) -> int:
+    return int(claims["sub"])
+
+
+def revocation_records(data: dict) -> List[dict]:
+    """
+    Записи отзыва из события user-service: по пользователю (jti пустой) или по токену.
+    expires_at - момент, после которого запись больше ничего не отзывает
+    """
+    event_type = data.get("event_type")
+    if event_type == "user.token_revoked":
+        return [{
+            "user_id": data.get("user_id"), "jti": data["jti"], "revoked_at": time.time(), "expires_at": data["exp"]
+        }]
+
+    if event_type == "user.status_changed" and data.get("new_status") in ("suspended", "inactive"):
+        user_ids = [data["user_id"]]
+    elif event_type == "user.deleted":
+        user_ids = [data["user_id"]]
+    elif event_type == "users.status_changed_bulk" and data.get("new_status") in ("suspended", "inactive"):
+        user_ids = data["user_ids"]
+    else:
+        return []
+
+    revoked_at = data.get("changed_at") or time.time()
+    return [
+        {"user_id": user_id, "jti": None, "revoked_at": revoked_at,
+         "expires_at": revoked_at + revocations.retention_seconds}
+        for user_id in user_ids
+    ]
+
+
+def apply_revocation_records(records: Iterable[dict]):
+    for record in records:
+        if record["jti"]:
+            revocations.revoke_token(record["jti"], record["expires_at"])
+        else:
+            revocations.revoke_subject(record["user_id"], record["revoked_at"])
+
+
+def apply_user_event(data: dict):
+    """Синхронизация списка отзыва по событиям user-service; устаревшие записи чистит таймер sync_revocations"""
+    apply_revocation_records(revocation_records(data))
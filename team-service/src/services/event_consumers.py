@@ -1,33 +1,142 @@
-from functools import partial
-from sqlalchemy import update
-from src.services.rabbitmq import consume_events
-from src.db.database import get_db
+import asyncio
+from collections import Counter, defaultdict
+from sqlalchemy import select, update, and_, func, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from src.services.rabbitmq import consume_events, publish_event, INSTANCE_ID
+from src.services.org_snapshot import apply_org_event, invalidate_org_snapshot
+from src.services.news_feed import apply_news_event
+from src.services.news_reads import invalidate_team_news_index
+from src.services.auth import apply_user_event
+from src.services.revocation_store import persist_user_event
+from src.api.utils import apply_headcount_deltas, record_org_changes
+from src.db.database import AsyncSessionLocal
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.db.models import OrgMember
+from src.db.models import OrgMember, OrgUnit, TeamInvite
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-async def handle_user_events(data: dict, db: AsyncSession):
+# id членства, подразделение и команда измененных строк
+CHANGED_MEMBER_COLUMNS = (
+    OrgMember.id,
+    OrgMember.org_unit_id,
+    select(OrgUnit.team_id).where(OrgUnit.id == OrgMember.org_unit_id).scalar_subquery()
+)
+
+
+def _unit_deltas(unit_ids: list, is_active: bool) -> dict:
+    step = 1 if is_active else -1
+    return {unit_id: step * count for unit_id, count in Counter(unit_ids).items()}
+
+
+async def _sync_member_rows(rows: list, is_active: bool, db: AsyncSession) -> list:
+    """Счетчики и журнал по измененным членствам; возвращает затронутые команды"""
+    await apply_headcount_deltas(_unit_deltas([unit_id for _, unit_id, _ in rows], is_active), db)
+    by_team = defaultdict(list)
+    for member_id, _, team_id in rows:
+        by_team[team_id].append(member_id)
+    team_ids = sorted(t for t in by_team if t is not None)
+    for team_id in team_ids:
+        await record_org_changes(team_id, db, member_ids=by_team[team_id])
+    return team_ids
+
+
+def _status_update(user_filter, is_active: bool):
+    """
+    Блокировка закрывает действующие членства с пометкой suspended_at;
+    активация открывает только их - членства, завершенные иначе, не трогаем
+    """
+    if is_active:
+        return (
+            update(OrgMember)
+            .where(and_(user_filter, OrgMember.is_active == False, OrgMember.suspended_at.isnot(None)))
+            .values(is_active=True, end_date=None, suspended_at=None)
+            .returning(*CHANGED_MEMBER_COLUMNS)
+        )
+    return (
+        update(OrgMember)
+        .where(and_(user_filter, OrgMember.is_active == True))
+        .values(is_active=False, end_date=func.now(), suspended_at=func.now())
+        .returning(*CHANGED_MEMBER_COLUMNS)
+    )
+
+
+async def handle_user_events(data: dict):
+    """Своя сессия на каждое сообщение: ошибка откатывает только его транзакцию"""
+    async with AsyncSessionLocal() as db:
+        try:
+            await _apply_user_event(data, db)
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def _apply_user_event(data: dict, db: AsyncSession):
+    await persist_user_event(data, db)
+    apply_user_event(data)
     event_type = data.get("event_type")
     if event_type == "user.status_changed":
         user_id = data["user_id"]
         new_status = data["new_status"]
 
+        is_active = new_status == "active"
+        res = await db.execute(_status_update(OrgMember.user_id == user_id, is_active))
+        team_ids = await _sync_member_rows(res.all(), is_active, db)
+        await db.commit()
+        for team_id in team_ids:
+            invalidate_org_snapshot(team_id)
+        await publish_event("org_member.status_synced", {"user_ids": [user_id], "team_ids": team_ids})
+        logger.info(f"Updated user {user_id} status in all org units")
+
+    elif event_type == "users.status_changed_bulk":
+        user_ids = data["user_ids"]
+        new_status = data["new_status"]
+
+        is_active = new_status == "active"
+        res = await db.execute(
+            _status_update(OrgMember.user_id == any_(bindparam("ids", user_ids, type_=ARRAY(Integer))), is_active)
+        )
+        team_ids = await _sync_member_rows(res.all(), is_active, db)
+        await db.commit()
+        for team_id in team_ids:
+            invalidate_org_snapshot(team_id)
+        await publish_event("org_member.status_synced", {"user_ids": user_ids, "team_ids": team_ids})
+        logger.info(f"Updated status of {len(user_ids)} users in all org units")
+
+    elif event_type == "user.invite_redeemed":
+        # Безлимитный код user-service разрешает сам, здесь только учет использований
         await db.execute(
-            update(OrgMember)
-            .where(OrgMember.user_id == user_id)
-            .values(is_active=new_status == "active")
+            update(TeamInvite)
+            .where(TeamInvite.code == data["invite_code"])
+            .values(used_count=TeamInvite.used_count + 1)
         )
         await db.commit()
-        logger.info(f"Updated user {user_id} status in all org units")
+
+
+async def handle_cache_events(data: dict):
+    if data.get("event_type", "").startswith("team_news."):
+        apply_news_event(data)
+        if data.get("origin") != INSTANCE_ID:
+            invalidate_team_news_index(data.get("team_id"))
+    else:
+        apply_org_event(data)
 
 
 async def setup_team_consumers():
+    # Очередь на каждый экземпляр: инвалидация локальных кэшей должна дойти до всех реплик
+    asyncio.create_task(consume_events(
+        queue_name=f"team_cache_{INSTANCE_ID}",
+        exchange_name="team_events",
+        routing_keys=[
+            "team.deactivated", "org_unit.*", "org_member.*", "org_members.*", "team_member.*", "team_news.*"
+        ],
+        callback=handle_cache_events,
+        durable=False
+    ))
     await consume_events(
         queue_name="team_service_queue",
         exchange_name="user_events",
-        routing_keys=["user.*"],
-        callback=partial(handle_user_events, db=await get_db().__anext__())
+        routing_keys=["user.*", "users.*"],
+        callback=handle_user_events
     )
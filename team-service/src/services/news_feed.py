@@ -0,0 +1,48 @@
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional
+from src.api.schemas import TeamNewsFeedOut
+from src.config import NEWS_FEED_CACHE_TEAMS
+from src.services.rabbitmq import INSTANCE_ID
+
+# team_id -> первая страница ленты для размера страницы по умолчанию
+_first_pages: "OrderedDict[int, TeamNewsFeedOut]" = OrderedDict()
+# Версия ленты команды растет при каждой записи: страница, прочитанная до записи, не кэшируется
+_versions: Dict[int, int] = defaultdict(int)
+
+
+def get_cached_first_page(team_id: int) -> Optional[TeamNewsFeedOut]:
+    page = _first_pages.get(team_id)
+    if page is not None:
+        _first_pages.move_to_end(team_id)
+    return page
+
+
+def news_feed_version(team_id: int) -> int:
+    """Версию берут до чтения страницы из БД и передают в cache_first_page"""
+    return _versions[team_id]
+
+
+def cache_first_page(team_id: int, page: TeamNewsFeedOut, version: int):
+    if _versions[team_id] != version:
+        return
+    _first_pages[team_id] = page
+    _first_pages.move_to_end(team_id)
+    if len(_first_pages) > NEWS_FEED_CACHE_TEAMS:
+        _first_pages.popitem(last=False)
+
+
+def invalidate_news_feed(team_id: int):
+    _versions[team_id] += 1
+    _first_pages.pop(team_id, None)
+
+
+def apply_news_event(data: dict):
+    """Сброс кэша по team_news.* от других экземпляров; свои записи сбрасывают кэш сразу"""
+    if data.get("origin") == INSTANCE_ID:
+        return
+    if data.get("team_id") is None:
+        for team_id in list(_versions):
+            _versions[team_id] += 1
+        _first_pages.clear()
+    else:
+        invalidate_news_feed(data["team_id"])
@@ -0,0 +1,206 @@
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import select, and_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import NEWS_READ_CACHE_SIZE, NEWS_READ_CACHE_TTL
+from src.db.models import TeamNews, NewsReadState
+
+
+class ReadBitmap:
+    """
+    Прочитанные seq: все <= watermark плюс битовая карта выше него.
+    Обычно пользователь читает подряд, поэтому карта почти всегда пустая или короткая
+    """
+    __slots__ = ("watermark", "bits")
+
+    def __init__(self, watermark: int = 0, bits: int = 0):
+        self.watermark = watermark
+        self.bits = bits
+
+    @classmethod
+    def decode(cls, watermark: int, blob: Optional[bytes]) -> "ReadBitmap":
+        bits = int.from_bytes(zlib.decompress(blob), "little") if blob else 0
+        return cls(watermark, bits)
+
+    def encode(self) -> bytes:
+        if not self.bits:
+            return b""
+        return zlib.compress(self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little"))
+
+    def mark(self, seqs: Iterable[int]):
+        for seq in seqs:
+            if seq > self.watermark:
+                self.bits |= 1 << (seq - self.watermark - 1)
+
+    def mark_all(self, max_seq: int):
+        if max_seq > self.watermark:
+            self.bits >>= max_seq - self.watermark
+            self.watermark = max_seq
+
+    def compact(self, published: int, max_seq: int):
+        """
+        Сдвигает watermark через прочитанные seq и дыры: удаленные новости и снятые с публикации.
+        Черновики seq не имеют, поэтому дырами стать не могут
+        """
+        span = max_seq - self.watermark
+        if span <= 0:
+            return
+        holes = ~(published >> (self.watermark + 1)) & ((1 << span) - 1)
+        effective = self.bits | holes
+        run = (effective ^ (effective + 1)).bit_length() - 1
+        if run:
+            self.watermark += run
+            self.bits >>= run
+
+    def unread(self, published: int) -> int:
+        return ((published >> (self.watermark + 1)) & ~self.bits).bit_count()
+
+
+class TeamNewsIndex:
+    """Опубликованные seq команды битовой картой (бит seq) и соответствие news_id -> seq"""
+    __slots__ = ("published", "max_seq", "seq_by_id")
+
+    def __init__(self):
+        self.published = 0
+        self.max_seq = 0
+        self.seq_by_id: Dict[int, int] = {}
+
+    def set(self, news_id: int, seq: Optional[int], is_published: bool):
+        if seq is None:
+            return
+        self.seq_by_id[news_id] = seq
+        self.max_seq = max(self.max_seq, seq)
+        if is_published:
+            self.published |= 1 << seq
+        else:
+            self.published &= ~(1 << seq)
+
+    def remove(self, news_id: int):
+        seq = self.seq_by_id.pop(news_id, None)
+        if seq is not None:
+            self.published &= ~(1 << seq)
+
+
+_indexes: Dict[int, TeamNewsIndex] = {}
+_versions: Dict[int, int] = defaultdict(int)
+_states: "OrderedDict[Tuple[int, int], Tuple[float, ReadBitmap]]" = OrderedDict()
+
+
+async def get_team_news_index(team_id: int, db: AsyncSession) -> TeamNewsIndex:
+    index = _indexes.get(team_id)
+    if index is None:
+        version = _versions[team_id]
+        res = await db.execute(
+            select(TeamNews.id, TeamNews.seq, TeamNews.is_published).where(TeamNews.team_id == team_id)
+        )
+        index = TeamNewsIndex()
+        for news_id, seq, is_published in res.all():
+            index.set(news_id, seq, bool(is_published))
+        # Если во время загрузки была запись, индекс не кэшируем: следующий запрос перечитает
+        if _versions[team_id] == version:
+            _indexes[team_id] = index
+    return index
+
+
+def update_team_news_index(team_id: int, news_id: int, seq: Optional[int], is_published: bool):
+    _versions[team_id] += 1
+    index = _indexes.get(team_id)
+    if index is not None:
+        index.set(news_id, seq, is_published)
+
+
+def remove_from_team_news_index(team_id: int, news_id: int):
+    _versions[team_id] += 1
+    index = _indexes.get(team_id)
+    if index is not None:
+        index.remove(news_id)
+
+
+def invalidate_team_news_index(team_id: Optional[int]):
+    if team_id is None:
+        for cached_team_id in list(_versions):
+            _versions[cached_team_id] += 1
+        _indexes.clear()
+    else:
+        _versions[team_id] += 1
+        _indexes.pop(team_id, None)
+
+
+def _remember(key: Tuple[int, int], state: ReadBitmap):
+    _states[key] = (time.monotonic(), state)
+    _states.move_to_end(key)
+    if len(_states) > NEWS_READ_CACHE_SIZE:
+        _states.popitem(last=False)
+
+
+async def get_read_state(user_id: int, team_id: int, db: AsyncSession) -> ReadBitmap:
+    """Состояние из кэша; TTL ограничивает расхождение с записями других экземпляров"""
+    key = (user_id, team_id)
+    cached = _states.get(key)
+    if cached is not None and time.monotonic() - cached[0] < NEWS_READ_CACHE_TTL:
+        _states.move_to_end(key)
+        return cached[1]
+
+    res = await db.execute(
+        select(NewsReadState.watermark, NewsReadState.bitmap).where(
+            and_(
+                NewsReadState.user_id == user_id,
+                NewsReadState.team_id == team_id
+            )
+        )
+    )
+    row = res.first()
+    state = ReadBitmap.decode(row.watermark, row.bitmap) if row else ReadBitmap()
+    _remember(key, state)
+    return state
+
+
+async def get_unread_count(user_id: int, team_id: int, db: AsyncSession) -> int:
+    index = await get_team_news_index(team_id, db)
+    state = await get_read_state(user_id, team_id, db)
+    return state.unread(index.published)
+
+
+async def mark_news_read(user_id: int, team_id: int, db: AsyncSession,
+                         news_ids: Iterable[int] = (), mark_all: bool = False) -> ReadBitmap:
+    """Одна строка news_read_states на пользователя и команду, сколько бы новостей ни отмечалось"""
+    index = await get_team_news_index(team_id, db)
+
+    res = await db.execute(
+        select(NewsReadState.watermark, NewsReadState.bitmap).where(
+            and_(
+                NewsReadState.user_id == user_id,
+                NewsReadState.team_id == team_id
+            )
+        ).with_for_update()
+    )
+    row = res.first()
+    state = ReadBitmap.decode(row.watermark, row.bitmap) if row else ReadBitmap()
+
+    if mark_all:
+        state.mark_all(index.max_seq)
+    else:
+        state.mark(index.seq_by_id[news_id] for news_id in news_ids if news_id in index.seq_by_id)
+    state.compact(index.published, index.max_seq)
+
+    stmt = insert(NewsReadState).values(
+        user_id=user_id,
+        team_id=team_id,
+        watermark=state.watermark,
+        bitmap=state.encode()
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[NewsReadState.user_id, NewsReadState.team_id],
+        set_={
+            "watermark": stmt.excluded.watermark,
+            "bitmap": stmt.excluded.bitmap,
+            "updated_at": func.now()
+        }
+    ))
+    await db.commit()
+
+    _remember((user_id, team_id), state)
+    return state
@@ -0,0 +1,229 @@
+"""
+Массовое размещение сотрудников по подразделениям команды и правка связей с руководителями.
+Проверка целиком в памяти, запись - три set-based запроса через unnest в одной транзакции
+"""
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set
+from fastapi import HTTPException
+from sqlalchemy import select, update, insert, and_, func, any_, bindparam, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.api.schemas import OrgMemberBulkRequest, OrgMemberBulkOut
+from src.api.utils import apply_headcount_deltas, record_org_changes
+from src.db.models import Team, OrgUnit, OrgMember
+from src.services.org_snapshot import MemberRecord, patch_org_members
+from src.services.rabbitmq import publish_event
+
+MEMBER_COLUMNS = (
+    OrgMember.id, OrgMember.user_id, OrgMember.org_unit_id, OrgMember.position, OrgMember.manager_id,
+    OrgMember.start_date
+)
+
+# Пространство ключей advisory-блокировок импорта; второй ключ - id команды
+ORG_IMPORT_LOCK_KEY = 4901
+
+
+def find_manager_cycles(edges: Dict[int, Set[int]], touched: Set[int]) -> List[List[int]]:
+    """
+    Циклы графа user -> manager, проходящие через измененные узлы.
+    Итеративный DFS с тремя цветами, O(V + E); старые циклы без затронутых узлов не мешают импорту
+    """
+    color: Dict[int, int] = {}
+    cycles = []
+    for start in touched:
+        if color.get(start):
+            continue
+        path, stack = [], [(start, iter(edges.get(start, ())))]
+        color[start] = 1
+        path.append(start)
+        while stack:
+            node, managers = stack[-1]
+            manager = next(managers, None)
+            if manager is None:
+                stack.pop()
+                path.pop()
+                color[node] = 2
+            elif color.get(manager) == 1:
+                cycle = path[path.index(manager):] + [manager]
+                if touched.intersection(cycle):
+                    cycles.append(cycle)
+            elif not color.get(manager):
+                color[manager] = 1
+                path.append(manager)
+                stack.append((manager, iter(edges.get(manager, ()))))
+    return cycles
+
+
+async def import_org_members(payload: OrgMemberBulkRequest, db: AsyncSession) -> OrgMemberBulkOut:
+    team_id = payload.team_id
+    # Параллельные импорты одной команды выполняются по очереди, иначе оба проверят одно исходное
+    # состояние и создадут дубли членств. Advisory-блокировка, а не строка teams: ее другие запросы
+    # берут последней в record_org_changes, и обратный порядок давал бы взаимные блокировки
+    await db.execute(select(func.pg_advisory_xact_lock(ORG_IMPORT_LOCK_KEY, team_id)))
+    team_res = await db.execute(select(Team.id).where(and_(Team.id == team_id, Team.is_active == True)))
+    if team_res.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Team not found")
+
+    units_res = await db.execute(select(OrgUnit.id).where(and_(OrgUnit.team_id == team_id, OrgUnit.is_active == True)))
+    unit_ids = set(units_res.scalars().all())
+
+    members_res = await db.execute(
+        select(*MEMBER_COLUMNS)
+        .join(OrgUnit, OrgUnit.id == OrgMember.org_unit_id)
+        .where(and_(OrgUnit.team_id == team_id, OrgMember.is_active == True))
+    )
+    current: Dict[int, MemberRecord] = {row.id: MemberRecord(*row) for row in members_res.all()}
+    by_user: Dict[int, List[MemberRecord]] = defaultdict(list)
+    for m in current.values():
+        by_user[m.user_id].append(m)
+
+    errors = []
+    placements = {}
+    for index, placement in enumerate(payload.placements):
+        if placement.org_unit_id not in unit_ids:
+            errors.append({"field": "placements", "index": index, "user_id": placement.user_id,
+                           "error": "Organizational unit not found in team"})
+        elif placement.user_id in placements:
+            errors.append({"field": "placements", "index": index, "user_id": placement.user_id,
+                           "error": "Duplicate user in placements"})
+        else:
+            placements[placement.user_id] = placement
+
+    manager_edges: Dict[int, Optional[int]] = {}
+    for index, edge in enumerate(payload.managers):
+        if edge.user_id in manager_edges:
+            error = "Duplicate user in managers"
+        elif edge.user_id not in placements and edge.user_id not in by_user:
+            error = "User is not a member of the team"
+        else:
+            manager_edges[edge.user_id] = edge.manager_id
+            continue
+        errors.append({"field": "managers", "index": index, "user_id": edge.user_id, "error": error})
+
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    # Итоговое состояние: member_id -> запись; новые строки отдельно, без id
+    final = dict(current)
+    removed_ids: List[int] = []
+    new_rows: List[tuple] = []
+    for user_id, placement in placements.items():
+        manager_id = manager_edges.get(user_id, placement.manager_id)
+        # Незаданные в размещении поля у сохраняемого членства не меняются
+        keep_manager = user_id not in manager_edges and placement.manager_id is None
+        kept = None
+        for m in by_user.get(user_id, ()):
+            if m.org_unit_id == placement.org_unit_id and kept is None:
+                kept = m
+                final[m.id] = m._replace(
+                    position=m.position if placement.position is None else placement.position,
+                    manager_id=m.manager_id if keep_manager else manager_id
+                )
+            elif payload.move_existing:
+                removed_ids.append(m.id)
+                del final[m.id]
+        if kept is None:
+            new_rows.append((user_id, placement.org_unit_id, placement.position, manager_id))
+
+    for user_id, manager_id in manager_edges.items():
+        if user_id not in placements:
+            for m in by_user[user_id]:
+                final[m.id] = m._replace(manager_id=manager_id)
+
+    graph: Dict[int, Set[int]] = defaultdict(set)
+    for m in final.values():
+        if m.manager_id is not None:
+            graph[m.user_id].add(m.manager_id)
+    for user_id, _, _, manager_id in new_rows:
+        if manager_id is not None:
+            graph[user_id].add(manager_id)
+
+    cycles = find_manager_cycles(graph, set(placements) | set(manager_edges))
+    if cycles:
+        raise HTTPException(status_code=400, detail=[
+            {"field": "managers", "user_id": cycle[0], "error": "Manager cycle: " + " -> ".join(map(str, cycle))}
+            for cycle in cycles
+        ])
+
+    changed = [m for member_id, m in final.items() if m != current[member_id]]
+
+    deltas = Counter()
+    upserts: List[MemberRecord] = []
+    if removed_ids:
+        # Членства, закрытые другим запросом после чтения, повторно не вычитаются из счетчиков
+        res = await db.execute(
+            update(OrgMember)
+            .where(and_(
+                OrgMember.id == any_(bindparam("member_ids", removed_ids, type_=ARRAY(Integer))),
+                OrgMember.is_active == True
+            ))
+            .values(is_active=False, end_date=func.now())
+            .returning(OrgMember.id, OrgMember.org_unit_id)
+            .execution_options(synchronize_session=False)
+        )
+        rows = res.all()
+        removed_ids = [member_id for member_id, _ in rows]
+        deltas.subtract(org_unit_id for _, org_unit_id in rows)
+
+    if payload.move_existing and placements:
+        # Членства, закрытые блокировкой, не восстанавливаются поверх нового размещения
+        await db.execute(
+            update(OrgMember)
+            .where(and_(
+                OrgMember.user_id == any_(bindparam("user_ids", list(placements), type_=ARRAY(Integer))),
+                OrgMember.org_unit_id.in_(select(OrgUnit.id).where(OrgUnit.team_id == team_id)),
+                OrgMember.suspended_at.isnot(None)
+            ))
+            .values(suspended_at=None)
+            .execution_options(synchronize_session=False)
+        )
+
+    if changed:
+        changes = select(
+            func.unnest(bindparam("member_ids", [m.id for m in changed], type_=ARRAY(Integer))).label("member_id"),
+            func.unnest(bindparam("positions", [m.position for m in changed], type_=ARRAY(String))).label("position"),
+            func.unnest(bindparam("managers", [m.manager_id for m in changed], type_=ARRAY(Integer))).label("manager_id")
+        ).subquery("changes")
+        res = await db.execute(
+            update(OrgMember)
+            .where(OrgMember.id == changes.c.member_id)
+            .values(position=changes.c.position, manager_id=changes.c.manager_id)
+            .returning(*MEMBER_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        upserts.extend(MemberRecord(*row) for row in res.all())
+
+    if new_rows:
+        user_ids, org_unit_ids, positions, manager_ids = (list(column) for column in zip(*new_rows))
+        rows = select(
+            func.unnest(bindparam("user_ids", user_ids, type_=ARRAY(Integer))),
+            func.unnest(bindparam("org_unit_ids", org_unit_ids, type_=ARRAY(Integer))),
+            func.unnest(bindparam("positions", positions, type_=ARRAY(String))),
+            func.unnest(bindparam("managers", manager_ids, type_=ARRAY(Integer)))
+        )
+        res = await db.execute(
+            insert(OrgMember)
+            .from_select(["user_id", "org_unit_id", "position", "manager_id"], rows)
+            .returning(*MEMBER_COLUMNS)
+        )
+        inserted = [MemberRecord(*row) for row in res.all()]
+        deltas.update(m.org_unit_id for m in inserted)
+        upserts.extend(inserted)
+
+    await apply_headcount_deltas(dict(deltas), db)
+    await record_org_changes(team_id, db, member_ids=removed_ids + [m.id for m in upserts])
+    await db.commit()
+
+    if not (removed_ids or upserts):
+        return OrgMemberBulkOut(team_id=team_id, added=0, updated=0, removed=0)
+
+    patch_org_members(team_id, upserts=upserts, removed_ids=removed_ids)
+    result = OrgMemberBulkOut(
+        team_id=team_id, added=len(new_rows), updated=len(changed), removed=len(removed_ids)
+    )
+    await publish_event("org_members.bulk_changed", {
+        "team_id": team_id,
+        "user_ids": sorted(set(placements) | set(manager_edges)),
+        **result.model_dump(exclude={"team_id"})
+    })
+    return result
@@ -0,0 +1,358 @@
+import asyncio
+from array import array
+from collections import defaultdict
+from datetime import datetime
+from functools import cached_property
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.api.utils import build_org_tree, membership_filter, unit_filter
+from src.config import ORG_SNAPSHOT_PATCH_LIMIT
+from src.db.models import Team, OrgUnit, OrgMember
+from src.services.rabbitmq import INSTANCE_ID
+
+
+class UnitRecord(NamedTuple):
+    id: int
+    parent_id: Optional[int]
+    level: int
+    name: str
+    description: Optional[str]
+    direct_count: int
+    subtree_count: int
+
+
+class MemberRecord(NamedTuple):
+    id: int
+    user_id: int
+    org_unit_id: int
+    position: Optional[str]
+    manager_id: Optional[int]
+    start_date: Optional[datetime]
+
+
+def member_record(member: OrgMember) -> MemberRecord:
+    return MemberRecord(
+        member.id, member.user_id, member.org_unit_id, member.position, member.manager_id, member.start_date
+    )
+
+
+class ManagerIndex:
+    """
+    Euler-tour нумерация графа manager_id: u - руководитель v (прямой или косвенный),
+    если enter[u] < enter[v] и exit[v] <= exit[u]. Построение O(n), проверка - два сравнения
+    """
+
+    def __init__(self, member_by_user: Dict[int, MemberRecord], reports: Dict[int, List[MemberRecord]]):
+        self.slots: Dict[int, int] = {user_id: slot for slot, user_id in enumerate(member_by_user)}
+        self.enter = array("i", bytes(4 * len(self.slots)))
+        self.exit = array("i", bytes(4 * len(self.slots)))
+
+        visited = bytearray(len(self.slots))
+        roots = [
+            user_id for user_id, m in member_by_user.items()
+            if m.manager_id not in member_by_user or m.manager_id == user_id
+        ]
+        # Узлы, до которых не дошли от корней, лежат на циклах: обходим их как отдельные корни
+        clock = 0
+        for root in roots + list(member_by_user):
+            if visited[self.slots[root]]:
+                continue
+            visited[self.slots[root]] = 1
+            self.enter[self.slots[root]] = clock
+            clock += 1
+            stack = [(root, iter(reports.get(root, ())))]
+            while stack:
+                user_id, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    self.exit[self.slots[user_id]] = clock
+                    clock += 1
+                    continue
+                slot = self.slots[child.user_id]
+                if visited[slot]:
+                    continue
+                visited[slot] = 1
+                self.enter[slot] = clock
+                clock += 1
+                stack.append((child.user_id, iter(reports.get(child.user_id, ()))))
+
+    def is_manager_of(self, manager_id: int, user_id: int) -> bool:
+        a = self.slots.get(manager_id)
+        b = self.slots.get(user_id)
+        if a is None or b is None or a == b:
+            return False
+        return self.enter[a] < self.enter[b] and self.exit[b] <= self.exit[a]
+
+
+class OrgSnapshot:
+    """
+    Неизменяемый снимок оргструктуры команды на момент version.
+    org_seq - номер журнала org_changes, прочитанный до загрузки: клиент продолжает /org_changes с него.
+    Производные индексы считаются лениво и живут вместе со снимком
+    """
+
+    def __init__(self, team_id: int, version: int, units: Dict[int, UnitRecord],
+                 members: Dict[int, MemberRecord], org_seq: int = 0):
+        self.team_id = team_id
+        self.version = version
+        self.org_seq = org_seq
+        self.units = units
+        self.members = members
+        self._trees: Dict[int, list] = {}
+
+    @property
+    def etag(self) -> str:
+        return f'"{INSTANCE_ID}-{self.team_id}-{self.version}"'
+
+    @cached_property
+    def ordered_units(self) -> List[UnitRecord]:
+        return sorted(self.units.values(), key=lambda u: (u.level, u.id))
+
+    @cached_property
+    def ordered_members(self) -> List[MemberRecord]:
+        return sorted(self.members.values(), key=lambda m: m.id)
+
+    @cached_property
+    def member_by_user(self) -> Dict[int, MemberRecord]:
+        result = {}
+        for m in self.ordered_members:
+            result.setdefault(m.user_id, m)
+        return result
+
+    @cached_property
+    def reports(self) -> Dict[int, List[MemberRecord]]:
+        """manager_id -> прямые подчиненные (по одному членству на пользователя)"""
+        result = defaultdict(list)
+        for m in self.member_by_user.values():
+            if m.manager_id is not None and m.manager_id != m.user_id:
+                result[m.manager_id].append(m)
+        return result
+
+    @cached_property
+    def manager_index(self) -> ManagerIndex:
+        return ManagerIndex(self.member_by_user, self.reports)
+
+    def tree(self, depth: int) -> list:
+        if depth not in self._trees:
+            self._trees[depth] = build_org_tree(self.ordered_units, self.ordered_members, depth)
+        return self._trees[depth]
+
+    def member_counts(self) -> Dict[int, dict]:
+        return {
+            unit.id: {"direct_count": unit.direct_count, "subtree_count": unit.subtree_count}
+            for unit in self.units.values()
+        }
+
+    def total_count(self) -> int:
+        return sum(unit.direct_count for unit in self.units.values())
+
+    def managers_chain(self, manager_id: Optional[int], max_depth: int) -> list:
+        result = []
+        seen = set()
+        while manager_id and manager_id not in seen and len(result) < max_depth:
+            seen.add(manager_id)
+            manager = self.member_by_user.get(manager_id)
+            if manager is None:
+                break
+            result.append({
+                "user_id": manager.user_id,
+                "position": manager.position,
+                "org_unit_id": manager.org_unit_id
+            })
+            manager_id = manager.manager_id
+        return result
+
+    def subordinates(self, user_id: int, max_depth: int) -> list:
+        root = {"subordinates": []}
+        seen = {user_id}
+        level = [(user_id, root)]
+        for _ in range(max_depth):
+            next_level = []
+            for manager_id, parent in level:
+                for m in self.reports.get(manager_id, []):
+                    if m.user_id in seen:
+                        continue
+                    seen.add(m.user_id)
+                    node = {
+                        "user_id": m.user_id,
+                        "position": m.position,
+                        "org_unit_id": m.org_unit_id,
+                        "subordinates": []
+                    }
+                    parent["subordinates"].append(node)
+                    next_level.append((m.user_id, node))
+            if not next_level:
+                break
+            level = next_level
+        return root["subordinates"]
+
+    def with_members(self, version: int, upserts: Iterable[MemberRecord],
+                     removed_ids: Iterable[int]) -> "OrgSnapshot":
+        members = dict(self.members)
+        deltas = defaultdict(int)
+        for member_id in removed_ids:
+            removed = members.pop(member_id, None)
+            if removed:
+                deltas[removed.org_unit_id] -= 1
+        for m in upserts:
+            previous = members.pop(m.id, None)
+            if previous:
+                deltas[previous.org_unit_id] -= 1
+            if m.org_unit_id in self.units:
+                members[m.id] = m
+                deltas[m.org_unit_id] += 1
+
+        units = self.units
+        if any(deltas.values()):
+            units = dict(units)
+            for unit_id, delta in deltas.items():
+                units[unit_id] = units[unit_id]._replace(direct_count=units[unit_id].direct_count + delta)
+                # Подъем по цепочке родителей, как и в БД
+                ancestor_id, seen = unit_id, set()
+                while ancestor_id in units and ancestor_id not in seen:
+                    seen.add(ancestor_id)
+                    ancestor = units[ancestor_id]
+                    units[ancestor_id] = ancestor._replace(subtree_count=ancestor.subtree_count + delta)
+                    ancestor_id = ancestor.parent_id
+        return OrgSnapshot(self.team_id, version, units, members, self.org_seq)
+
+
+_snapshots: Dict[int, OrgSnapshot] = {}
+_versions: Dict[int, int] = defaultdict(int)
+_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+async def _load_snapshot(team_id: int, version: int, db: AsyncSession,
+                         as_of: Optional[datetime] = None) -> OrgSnapshot:
+    org_seq = 0
+    if as_of is None:
+        # seq читается раньше данных: изменения между чтениями клиент получит повторно, но не потеряет
+        seq_res = await db.execute(select(Team.org_seq).where(Team.id == team_id))
+        org_seq = seq_res.scalar_one_or_none() or 0
+
+    units_res = await db.execute(
+        select(
+            OrgUnit.id,
+            OrgUnit.parent_id,
+            OrgUnit.level,
+            OrgUnit.name,
+            OrgUnit.description,
+            OrgUnit.direct_count,
+            OrgUnit.subtree_count
+        )
+        .where(
+            and_(
+                OrgUnit.team_id == team_id,
+                unit_filter(as_of)
+            )
+        )
+    )
+    units = {row.id: UnitRecord(*row) for row in units_res.all()}
+
+    members_res = await db.execute(
+        select(
+            OrgMember.id,
+            OrgMember.user_id,
+            OrgMember.org_unit_id,
+            OrgMember.position,
+            OrgMember.manager_id,
+            OrgMember.start_date
+        )
+        .join(OrgUnit, OrgUnit.id == OrgMember.org_unit_id)
+        .where(
+            and_(
+                OrgUnit.team_id == team_id,
+                unit_filter(as_of),
+                membership_filter(OrgMember, as_of)
+            )
+        )
+    )
+    members = {row.id: MemberRecord(*row) for row in members_res.all()}
+
+    if as_of is not None:
+        units = _historical_counts(units, members)
+    return OrgSnapshot(team_id, version, units, members, org_seq)
+
+
+def _historical_counts(units: Dict[int, UnitRecord], members: Dict[int, MemberRecord]) -> Dict[int, UnitRecord]:
+    """Счетчики в таблице актуальны только на текущий момент, для прошлого считаем по загруженным членствам"""
+    direct = defaultdict(int)
+    for m in members.values():
+        direct[m.org_unit_id] += 1
+
+    subtree = dict(direct)
+    for unit in sorted(units.values(), key=lambda u: u.level, reverse=True):
+        if unit.parent_id in units and unit.parent_id != unit.id:
+            subtree[unit.parent_id] = subtree.get(unit.parent_id, 0) + subtree.get(unit.id, 0)
+
+    return {
+        unit_id: unit._replace(direct_count=direct.get(unit_id, 0), subtree_count=subtree.get(unit_id, 0))
+        for unit_id, unit in units.items()
+    }
+
+
+async def load_org_snapshot_as_of(team_id: int, as_of: datetime, db: AsyncSession) -> OrgSnapshot:
+    """Снимок оргструктуры на прошлую дату; не кэшируется"""
+    return await _load_snapshot(team_id, -1, db, as_of)
+
+
+async def get_org_snapshot(team_id: int, db: AsyncSession) -> OrgSnapshot:
+    snapshot = _snapshots.get(team_id)
+    if snapshot is not None and snapshot.version == _versions[team_id]:
+        return snapshot
+
+    async with _locks[team_id]:
+        version = _versions[team_id]
+        snapshot = _snapshots.get(team_id)
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        snapshot = await _load_snapshot(team_id, version, db)
+        # Если во время загрузки была запись, снимок не кэшируем: следующий запрос перечитает
+        if _versions[team_id] == version:
+            _snapshots[team_id] = snapshot
+        return snapshot
+
+
+def patch_org_members(team_id: int, upserts: Iterable[MemberRecord] = (), removed_ids: Iterable[int] = ()):
+    """Точечное обновление снимка после изменения членств; крупные изменения сбрасывают снимок"""
+    if team_id is None:
+        return
+    upserts, removed_ids = list(upserts), list(removed_ids)
+    current = _versions[team_id]
+    _versions[team_id] = current + 1
+
+    snapshot = _snapshots.pop(team_id, None)
+    if snapshot is None or snapshot.version != current:
+        return
+    if len(upserts) + len(removed_ids) > ORG_SNAPSHOT_PATCH_LIMIT:
+        return
+    _snapshots[team_id] = snapshot.with_members(current + 1, upserts, removed_ids)
+
+
+def invalidate_org_snapshot(team_id: int):
+    _versions[team_id] += 1
+    _snapshots.pop(team_id, None)
+
+
+def invalidate_all_org_snapshots():
+    for team_id in list(_versions):
+        _versions[team_id] += 1
+    _snapshots.clear()
+
+
+def apply_org_event(data: dict):
+    """Инвалидация по событиям других экземпляров сервиса; свои записи уже применены локально"""
+    if data.get("origin") == INSTANCE_ID:
+        return
+    if "team_ids" in data:
+        for team_id in data["team_ids"]:
+            invalidate_org_snapshot(team_id)
+        return
+    team_id = data.get("team_id")
+    if team_id is None:
+        invalidate_all_org_snapshots()
+    else:
+        invalidate_org_snapshot(team_id)
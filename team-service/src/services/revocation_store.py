@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import REVOCATION_SYNC_INTERVAL
+from src.db.database import AsyncSessionLocal
+from src.db.models import TokenRevocation
+from src.services.auth import revocations, revocation_records, apply_revocation_records
+
+logger = logging.getLogger(__name__)
+
+# Время БД на момент прошлой загрузки: следующая догружает только новые записи
+_synced_at: Optional[datetime] = None
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+async def persist_user_event(data: dict, db: AsyncSession):
+    """Сохраняет отзыв из события, чтобы список пережил рестарт и дошел до остальных экземпляров"""
+    records = revocation_records(data)
+    if not records:
+        return
+    await db.execute(insert(TokenRevocation), [
+        {
+            "user_id": record["user_id"],
+            "jti": record["jti"],
+            "revoked_at": _to_datetime(record["revoked_at"]),
+            "expires_at": _to_datetime(record["expires_at"])
+        }
+        for record in records
+    ])
+    await db.commit()
+
+
+async def load_revocations(db: AsyncSession) -> int:
+    global _synced_at
+    now = (await db.execute(select(func.now()))).scalar_one()
+    query = select(
+        TokenRevocation.user_id, TokenRevocation.jti, TokenRevocation.revoked_at, TokenRevocation.expires_at
+    ).where(TokenRevocation.expires_at > now)
+    if _synced_at is not None:
+        # Перекрытие на интервал покрывает записи, закоммиченные после прошлой загрузки; повтор идемпотентен
+        query = query.where(TokenRevocation.created_at > _synced_at - timedelta(seconds=REVOCATION_SYNC_INTERVAL))
+    res = await db.execute(query)
+    rows = res.all()
+    apply_revocation_records(
+        {
+            "user_id": row.user_id,
+            "jti": row.jti,
+            "revoked_at": row.revoked_at.timestamp(),
+            "expires_at": row.expires_at.timestamp()
+        }
+        for row in rows
+    )
+    _synced_at = now
+    return len(rows)
+
+
+async def sync_revocations():
+    """
+    Восстановление списка отзыва из token_revocations при старте, затем догрузка
+    и очистка истекших записей по таймеру, а не на каждом событии
+    """
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                loaded = await load_revocations(db)
+                await db.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= func.now()))
+                await db.commit()
+            revocations.purge()
+            if loaded:
+                logger.info(f"Loaded {loaded} token revocations")
+        except Exception as e:
+            logger.error(f"Revocation sync failed: {e}")
+        await asyncio.sleep(REVOCATION_SYNC_INTERVAL)
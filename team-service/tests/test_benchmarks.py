@@ -0,0 +1,47 @@
+"""
+Замеры производительности; запускаются только с RUN_BENCHMARKS=1 (и TEST_DB_NAME), результаты печатаются:
+RUN_BENCHMARKS=1 python -m pytest -q -s tests/test_benchmarks.py
+Пороги assert заведомо щедрые и ловят только возврат к квадратичной сборке
+"""
+import os
+import time
+import pytest
+from sqlalchemy import text
+from src.services.org_snapshot import get_org_snapshot, invalidate_org_snapshot
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="RUN_BENCHMARKS is not set")
+
+UNITS = 5000
+MEMBERS = 50000
+SEED = (
+    "INSERT INTO teams (id, name, is_active) VALUES (1, 'Benchmark', true)",
+    # Пятиричное дерево: дети узла p - 5(p-1)+2 .. 5p+1
+    f"""
+    INSERT INTO org_units (id, team_id, name, parent_id, level, is_active)
+    SELECT g, 1, 'Unit ' || g, CASE WHEN g > 1 THEN (g - 2) / 5 + 1 END, ceil(log(5, 4 * g + 1))::int, true
+    FROM generate_series(1, {UNITS}) g
+    """,
+    f"""
+    INSERT INTO org_members (user_id, org_unit_id, manager_id, is_active, start_date)
+    SELECT g, g % {UNITS} + 1, nullif(g / 10, 0), true, now() FROM generate_series(1, {MEMBERS}) g
+    """,
+    "ANALYZE",
+)
+
+
+async def test_org_snapshot_rebuild(db):
+    for statement in SEED:
+        await db.execute(text(statement))
+    await db.commit()
+    invalidate_org_snapshot(1)
+
+    started = time.perf_counter()
+    snapshot = await get_org_snapshot(1, db)
+    loaded = time.perf_counter()
+    tree = snapshot.tree(20)
+    built = time.perf_counter()
+
+    print(f"\norg snapshot {UNITS} units / {MEMBERS} members: "
+          f"load {(loaded - started) * 1000:.0f} ms, tree {(built - loaded) * 1000:.0f} ms")
+    assert len(tree) == 1
+    assert built - loaded < 1.0
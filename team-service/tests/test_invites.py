@@ -0,0 +1,32 @@
+import asyncio
+from sqlalchemy import select
+from src.db.models import Team, TeamInvite
+
+MAX_USES = 5
+ATTEMPTS = 30
+
+
+async def test_concurrent_redemption_stops_at_max_uses(client, db):
+    team = Team(name="Onboarding", invite_code="team-code")
+    db.add(team)
+    await db.flush()
+    db.add(TeamInvite(team_id=team.id, code="hot-code", max_uses=MAX_USES))
+    await db.commit()
+
+    responses = await asyncio.gather(*(
+        client.post("/api/team/invites/redeem", json={"code": "hot-code"}) for _ in range(ATTEMPTS)
+    ))
+
+    codes = [r.status_code for r in responses]
+    assert codes.count(200) == MAX_USES
+    assert codes.count(410) == ATTEMPTS - MAX_USES
+    assert sorted(r.json()["remaining_uses"] for r in responses if r.status_code == 200) == list(range(MAX_USES))
+
+    used_count = await db.scalar(select(TeamInvite.used_count).where(TeamInvite.code == "hot-code"))
+    assert used_count == MAX_USES
+
+
+async def test_redeem_unknown_code_returns_404(client):
+    response = await client.post("/api/team/invites/redeem", json={"code": "missing"})
+
+    assert response.status_code == 404
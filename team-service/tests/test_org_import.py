@@ -0,0 +1,32 @@
+import asyncio
+from sqlalchemy import select
+from src.db.models import Team, OrgUnit
+
+REQUESTS = 20
+
+
+async def test_concurrent_import_and_add_do_not_deadlock(client, db):
+    team = Team(name="Platform", invite_code="platform-code")
+    db.add(team)
+    await db.flush()
+    unit = OrgUnit(team_id=team.id, name="Core", level=1)
+    db.add(unit)
+    await db.commit()
+
+    imports = (
+        client.post("/api/org_members/bulk", json={
+            "team_id": team.id, "placements": [{"user_id": i, "org_unit_id": unit.id}]
+        })
+        for i in range(REQUESTS)
+    )
+    adds = (
+        client.post("/api/org_members", json={"user_id": REQUESTS + i, "org_unit_id": unit.id})
+        for i in range(REQUESTS)
+    )
+    responses = await asyncio.gather(*(call for pair in zip(imports, adds) for call in pair))
+
+    assert [r.status_code for r in responses] == [200] * (2 * REQUESTS)
+    direct_count = await db.scalar(
+        select(OrgUnit.direct_count).where(OrgUnit.id == unit.id).execution_options(populate_existing=True)
+    )
+    assert direct_count == 2 * REQUESTS
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import select
+from src.db.models import Team, OrgUnitClosure
+
+
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+async def test_move_rebuilds_closure_of_subtree(client, db):
+    team = Team(name="Sales", invite_code="sales-code")
+    db.add(team)
+    await db.commit()
+
+    async def create_unit(name, parent_id=None):
+        response = await client.post("/api/org_units", json={"team_id": team.id, "name": name, "parent_id": parent_id})
+        assert response.status_code == 200
+        return response.json()["id"]
+
+    old_root = await create_unit("EMEA")
+    branch = await create_unit("Germany", old_root)
+    leaf = await create_unit("Berlin", branch)
+    new_root = await create_unit("Europe")
+
+    response = await client.post(f"/api/org_units/{branch}/move", json={"parent_id": new_root})
+
+    assert response.status_code == 200
+    res = await db.execute(
+        select(OrgUnitClosure.ancestor_id, OrgUnitClosure.depth).where(OrgUnitClosure.descendant_id == leaf)
+    )
+    assert dict(res.all()) == {leaf: 0, branch: 1, new_root: 2}
+
+
+async def test_team_members_total_comes_from_unit_counters(client, db):
+    team = Team(name="Support", invite_code="support-code")
+    db.add(team)
+    await db.commit()
+    unit = (await client.post("/api/org_units", json={"team_id": team.id, "name": "Tier 1"})).json()["id"]
+    for user_id in (1, 2, 3):
+        assert (await client.post("/api/org_members", json={"user_id": user_id, "org_unit_id": unit})).status_code == 200
+    member_id = (await client.get(f"/api/teams/{team.id}/members")).json()["members"][0]["member_id"]
+    assert (await client.delete(f"/api/org_members/{member_id}")).status_code == 200
+
+    response = await client.get(f"/api/teams/{team.id}/members")
+
+    assert response.status_code == 200
+    assert response.json()["total_count"] == len(response.json()["members"]) == 2
+
+
+async def test_org_structure_rejects_unbounded_depth(client, db):
+    team = Team(name="Legal", invite_code="legal-code")
+    db.add(team)
+    await db.commit()
+    assert (await client.post("/api/org_units", json={"team_id": team.id, "name": "Contracts"})).status_code == 200
+
+    assert (await client.get(f"/api/org_structure/{team.id}", params={"depth": 5})).status_code == 200
+    assert (await client.get(f"/api/org_structure/{team.id}", params={"depth": 10_000})).status_code == 422
+
+
+async def test_status_event_invalidates_only_affected_team(client, db):
+    from src.services import org_snapshot
+    from src.services.event_consumers import handle_user_events
+
+    team_ids = []
+    for name in ("Alpha", "Beta"):
+        team = Team(name=name, invite_code=f"{name.lower()}-code")
+        db.add(team)
+        await db.commit()
+        unit = (await client.post("/api/org_units", json={"team_id": team.id, "name": name})).json()["id"]
+        user_id = len(team_ids) + 1
+        assert (await client.post("/api/org_members", json={"user_id": user_id, "org_unit_id": unit})).status_code == 200
+        assert (await client.get(f"/api/org_structure/{team.id}")).status_code == 200
+        team_ids.append(team.id)
+
+    await handle_user_events({"event_type": "user.status_changed", "user_id": 1, "new_status": "suspended"})
+
+    assert team_ids[0] not in org_snapshot._snapshots
+    assert team_ids[1] in org_snapshot._snapshots
@@ -0,0 +1,79 @@
+"""Регрессия планов: горячие запросы должны идти по индексам из миграции c81d0f4b6e57"""
+import pytest
+from sqlalchemy import select, and_, text
+from sqlalchemy.dialects import postgresql
+from src.api.utils import unit_filter
+from src.db.models import OrgMember, OrgUnit, TeamInvite, TeamNews
+
+SEED = (
+    "INSERT INTO teams (id, name, is_active) SELECT g, 'Team ' || g, true FROM generate_series(1, 50) g",
+    """
+    INSERT INTO org_units (id, team_id, name, level, is_active)
+    SELECT g, g % 50 + 1, 'Unit ' || g, 1, g % 10 <> 0 FROM generate_series(1, 5000) g
+    """,
+    """
+    INSERT INTO org_members (user_id, org_unit_id, manager_id, is_active, start_date)
+    SELECT g, g % 5000 + 1, nullif(g / 10, 0), g % 5 <> 0, now() - interval '1 year'
+    FROM generate_series(1, 50000) g
+    """,
+    """
+    INSERT INTO team_news (team_id, author_id, title, content, is_published, created_at)
+    SELECT g % 50 + 1, 1, 'News ' || g, 'Body', g % 3 <> 0, now() - g * interval '1 minute'
+    FROM generate_series(1, 20000) g
+    """,
+    "INSERT INTO team_invites (team_id, code) SELECT g % 50 + 1, 'code-' || g FROM generate_series(1, 5000) g",
+    "ANALYZE",
+)
+
+CASES = [
+    (
+        "members_by_user",
+        select(OrgMember.id).where(and_(OrgMember.user_id == 42, OrgMember.is_active == True)),
+        "ix_org_members_user_id_is_active"
+    ),
+    (
+        "members_by_unit",
+        select(OrgMember.id).where(and_(OrgMember.org_unit_id == 42, OrgMember.is_active == True)),
+        "ix_org_members_org_unit_id_is_active"
+    ),
+    (
+        "subordinates",
+        select(OrgMember.user_id).where(and_(OrgMember.manager_id == 42, OrgMember.is_active == True)),
+        "ix_org_members_manager_id_active"
+    ),
+    (
+        "team_units",
+        select(OrgUnit.id).where(and_(OrgUnit.team_id == 7, unit_filter())),
+        "ix_org_units_team_id_active"
+    ),
+    (
+        "news_feed",
+        select(TeamNews.id, TeamNews.title)
+        .where(and_(TeamNews.team_id == 7, TeamNews.is_published == True))
+        .order_by(TeamNews.created_at.desc(), TeamNews.id.desc())
+        .limit(20),
+        "ix_team_news_team_feed"
+    ),
+    (
+        "invite_by_code",
+        select(TeamInvite.id).where(TeamInvite.code == "code-42"),
+        "team_invites_code_key"
+    ),
+]
+
+
+@pytest.fixture
+async def seeded_db(db):
+    for statement in SEED:
+        await db.execute(text(statement))
+    await db.commit()
+    return db
+
+
+@pytest.mark.parametrize("name, query, index", CASES, ids=[case[0] for case in CASES])
+async def test_query_uses_index(seeded_db, name, query, index):
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    res = await seeded_db.execute(text(f"EXPLAIN {sql}"))
+    plan = "\n".join(res.scalars().all())
+
+    assert index in plan, plan
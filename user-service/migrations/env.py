@@ -10,7 +10,7 @@ from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 from src.db.database import Base, DATABASE_URL
-from src.db.models import User
+from src.db.models import User, TeamInvite
 
 config = context.config
 config.set_main_option("sqlalchemy.url", DATABASE_URL)
@@ -0,0 +1,37 @@
+"""Team invites projection
+
+Revision ID: 3b7e2c91d4a6
+Revises: f104680cf58b
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e2c91d4a6'
+down_revision: Union[str, Sequence[str], None] = 'f104680cf58b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('team_invites',
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('invite_code', sa.String(), nullable=False),
+    sa.Column('team_name', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('team_id')
+    )
+    op.create_index(op.f('ix_team_invites_invite_code'), 'team_invites', ['invite_code'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_team_invites_invite_code'), table_name='team_invites')
+    op.drop_table('team_invites')
@@ -0,0 +1,40 @@
+"""Team invites projection per code
+
+Revision ID: 6e1b9d4c7a02
+Revises: 8d41f0a6c2e5
+Create Date: 2026-10-19 16:21:08.104375
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1b9d4c7a02'
+down_revision: Union[str, Sequence[str], None] = '8d41f0a6c2e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('team_invites_pkey', 'team_invites', type_='primary')
+    op.drop_index(op.f('ix_team_invites_invite_code'), table_name='team_invites')
+    op.create_primary_key('team_invites_pkey', 'team_invites', ['invite_code'])
+    op.create_index(op.f('ix_team_invites_team_id'), 'team_invites', ['team_id'], unique=False)
+    op.add_column('team_invites', sa.Column('max_uses', sa.Integer(), nullable=True))
+    op.add_column('team_invites', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # В старой схеме у команды один код - остаются только основные
+    op.execute("DELETE FROM team_invites WHERE max_uses IS NOT NULL OR expires_at IS NOT NULL")
+    op.drop_column('team_invites', 'expires_at')
+    op.drop_column('team_invites', 'max_uses')
+    op.drop_index(op.f('ix_team_invites_team_id'), table_name='team_invites')
+    op.drop_constraint('team_invites_pkey', 'team_invites', type_='primary')
+    op.create_index(op.f('ix_team_invites_invite_code'), 'team_invites', ['invite_code'], unique=True)
+    op.create_primary_key('team_invites_pkey', 'team_invites', ['team_id'])
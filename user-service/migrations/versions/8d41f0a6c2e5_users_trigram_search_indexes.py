@@ -0,0 +1,40 @@
+"""Users trigram search indexes
+
+Revision ID: 8d41f0a6c2e5
+Revises: 3b7e2c91d4a6
+Create Date: 2026-10-19 11:04:17.552930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41f0a6c2e5'
+down_revision: Union[str, Sequence[str], None] = '3b7e2c91d4a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_FIELDS = ('name', 'email', 'department', 'position')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        for field in TRGM_FIELDS:
+            op.create_index(
+                f'ix_users_{field}_trgm', 'users', [field], unique=False,
+                postgresql_using='gin',
+                postgresql_ops={field: 'gin_trgm_ops'},
+                postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for field in TRGM_FIELDS:
+            op.drop_index(f'ix_users_{field}_trgm', table_name='users', postgresql_concurrently=True)
@@ -1,65 +1,114 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+import time
+from fastapi import APIRouter, Depends, HTTPException, Response, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, func, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from src.db.database import get_db
 from src.db.models import User, UserStatus, UserRole
-from src.api.schemas import UserCreate, UserUpdate, Token, UserOut, UserLogin
-from src.api.utils import hash_password, verify_password, create_access_token, validate_invite_code
+from src.api.schemas import UserCreate, UserUpdate, Token, UserOut, UserLogin, BatchGetRequest, UserBatchOut, \
+    UserImportOut, UserSearchOut, BulkStatusUpdate, BulkTeamAssign, BulkUpdateOut
+from src.api.utils import hash_password, verify_password, verify_and_update_password, create_access_token, \
+    redeem_invite_code, user_search_clauses, keyset_after, encode_cursor, get_dummy_hash
 from src.services.rabbitmq import publish_event
-from typing import List
+from src.services.http_client import upstream_metrics
+from src.services.auth import get_current_claims, get_current_user_id, apply_user_event
+from src.services.revocation_store import persist_user_event
+from src.services.throttle import check_login_allowed, throttle_metrics
+from src.services.user_import import parse_import_payload, import_users, ImportFormatError
+from typing import List, Optional
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+async def _discard_registration(user_id: int, db: AsyncSession):
+    """Откат регистрации, приглашение которой не принято"""
+    await db.execute(delete(User).where(User.id == user_id))
+    await db.commit()
+
+
 @router.post("/register", response_model=UserOut)
 async def register(payload: UserCreate, db: AsyncSession = Depends(get_db)):
-    res = await db.execute(select(User).where(User.email == payload.email))
-    if res.scalar_one_or_none():
+    # уникальный индекс по email решает гонку двух одновременных регистраций
+    res = await db.execute(
+        insert(User)
+        .values(
+            email=payload.email,
+            name=payload.name,
+            hashed_password=await hash_password(payload.password),
+            role=UserRole.USER,
+            status=UserStatus.PENDING,
+            invite_code=payload.invite_code
+        )
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User)
+    )
+    user = res.scalar_one_or_none()
+    if not user:
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Email already registered")
+    # Коммит до списания приглашения: сбой записи не должен тратить использование
+    await db.commit()
 
-    team_id = None
     if payload.invite_code:
         try:
-            team_data = await validate_invite_code(payload.invite_code)
-            if not team_data:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid or expired invite code"
-                )
-            team_id = team_data.get("team_id")
+            team_data = await redeem_invite_code(payload.invite_code)
+        except HTTPException:
+            await _discard_registration(user.id, db)
+            raise
         except Exception as e:
+            await _discard_registration(user.id, db)
             logger.error(f"Error validating invite code: {e}")
             raise HTTPException(
                 status_code=400,
                 detail="Could not validate invite code"
             )
+        if not team_data:
+            await _discard_registration(user.id, db)
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid or expired invite code"
+            )
+        res = await db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(team_id=team_data["team_id"], status=UserStatus.ACTIVE)
+            .returning(User)
+            .execution_options(synchronize_session=False)
+        )
+        user = res.scalar_one()
+        await db.commit()
 
-    user = User(
-        email=payload.email,
-        name=payload.name,
-        hashed_password=hash_password(payload.password),
-        role=UserRole.USER,
-        status=UserStatus.ACTIVE if team_id else UserStatus.PENDING,
-        team_id=team_id,
-        invite_code=payload.invite_code
-    )
-
-    db.add(user)
-    await db.commit()
-    await db.refresh(user)
-
+    if payload.invite_code and team_data.get("redeemed_locally"):
+        await publish_event("user.invite_redeemed", {
+            "user_id": user.id,
+            "team_id": team_data["team_id"],
+            "invite_code": payload.invite_code
+        })
     return user
 
 
 @router.post("/login", response_model=Token)
-async def login(payload: UserLogin, db: AsyncSession = Depends(get_db)):
+async def login(payload: UserLogin, request: Request, db: AsyncSession = Depends(get_db)):
+    check_login_allowed(payload.email, request.client.host if request.client else None)
+
     res = await db.execute(select(User).where(User.email == payload.email))
     user = res.scalar_one_or_none()
-    if not user or not verify_password(payload.password, user.hashed_password):
+    if not user:
+        await verify_password(payload.password, get_dummy_hash())
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    valid, new_hash = await verify_and_update_password(payload.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    if new_hash:
+        await db.execute(
+            update(User).where(User.id == user.id).values(hashed_password=new_hash)
+        )
+        await db.commit()
+
     if user.status == UserStatus.SUSPENDED:
         raise HTTPException(status_code=403, detail="User account is suspended")
 
@@ -67,6 +116,43 @@ async def login(payload: UserLogin, db: AsyncSession = Depends(get_db)):
     return {"access_token": token, "token_type": "bearer"}
 
 
+@router.post("/logout")
+async def logout(claims: dict = Depends(get_current_claims), db: AsyncSession = Depends(get_db)):
+    if not claims.get("jti"):
+        raise HTTPException(status_code=400, detail="Token cannot be revoked")
+
+    event = {"user_id": int(claims["sub"]), "jti": claims["jti"], "exp": claims["exp"]}
+    revocation = {"event_type": "user.token_revoked", **event}
+    await persist_user_event(revocation, db)
+    apply_user_event(revocation)
+    await publish_event("user.token_revoked", event)
+
+    return {"message": "Logged out"}
+
+
+@router.post("/users/import", response_model=UserImportOut)
+async def import_users_bulk(
+        request: Request,
+        fmt: Optional[str] = Query(None, alias="format", description="csv или ndjson"),
+        team_id: Optional[int] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    if not fmt:
+        fmt = "ndjson" if "ndjson" in request.headers.get("content-type", "") else "csv"
+
+    payload = (await request.body()).decode("utf-8")
+    try:
+        raw_rows = parse_import_payload(payload, fmt)
+        return await import_users(raw_rows, db, team_id)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/metrics")
+async def get_metrics():
+    return {"upstreams": upstream_metrics(), "login_throttle": throttle_metrics()}
+
+
 @router.get("/users", response_model=List[UserOut])
 async def get_users(db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(User))
@@ -74,6 +160,76 @@ async def get_users(db: AsyncSession = Depends(get_db)):
     return users
 
 
+@router.get("/users/search", response_model=UserSearchOut)
+async def search_users(
+        q: str = Query(..., min_length=1, max_length=100),
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = None,
+        facets: bool = True,
+        db: AsyncSession = Depends(get_db)
+):
+    condition, rank = user_search_clauses(q)
+
+    query = select(User, rank.label("rank")).where(condition)
+    if cursor:
+        query = query.where(keyset_after(rank, cursor))
+    res = await db.execute(query.order_by(rank.desc(), User.id).limit(limit + 1))
+    rows = res.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_user, last_rank = rows[-1]
+        next_cursor = encode_cursor(last_rank, last_user.id)
+
+    facet_counts = None
+    if facets:
+        facet_res = await db.execute(
+            select(
+                User.department, User.status, User.role,
+                func.grouping(User.department).label("by_department"),
+                func.grouping(User.status).label("by_status"),
+                func.count().label("count")
+            )
+            .where(condition)
+            .group_by(func.grouping_sets(User.department, User.status, User.role))
+        )
+        facet_counts = {"department": {}, "status": {}, "role": {}}
+        for row in facet_res.all():
+            if row.by_department == 0:
+                facet_counts["department"][row.department or ""] = row.count
+            elif row.by_status == 0:
+                facet_counts["status"][row.status.value] = row.count
+            else:
+                facet_counts["role"][row.role.value] = row.count
+
+    return UserSearchOut(items=[user for user, _ in rows], next_cursor=next_cursor, facets=facet_counts)
+
+
+@router.get("/users/me", response_model=UserOut)
+async def get_me(user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_db)):
+    res = await db.execute(select(User).where(User.id == user_id))
+    user = res.scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+@router.post("/users:batchGet", response_model=UserBatchOut)
+async def batch_get_users(payload: BatchGetRequest, db: AsyncSession = Depends(get_db)):
+    ids = list(dict.fromkeys(payload.ids))
+    res = await db.execute(
+        select(User).where(User.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
+    )
+    found = {user.id: user for user in res.scalars().all()}
+
+    batch = UserBatchOut(
+        items=[found[i] for i in ids if i in found],
+        missing=[i for i in ids if i not in found]
+    )
+    return Response(content=batch.model_dump_json(), media_type="application/json")
+
+
 @router.get("/users/{user_id}", response_model=UserOut)
 async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
     res = await db.execute(select(User).where(User.id == user_id))
@@ -103,6 +259,18 @@ async def update_user(user_id: int, payload: UserUpdate, db: AsyncSession = Depe
             "updated_fields": list(update_data.keys())
         })
 
+        if "status" in update_data:
+            event = {
+                "user_id": user.id,
+                "new_status": user.status.value,
+                "team_id": user.team_id,
+                "changed_at": time.time()
+            }
+            revocation = {"event_type": "user.status_changed", **event}
+            await persist_user_event(revocation, db)
+            apply_user_event(revocation)
+            await publish_event("user.status_changed", event)
+
     return user
 
 
@@ -116,10 +284,11 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
     await db.execute(delete(User).where(User.id == user_id))
     await db.commit()
 
-    await publish_event("user.deleted", {
-        "user_id": user_id,
-        "email": user.email
-    })
+    event = {"user_id": user_id, "email": user.email, "changed_at": time.time()}
+    revocation = {"event_type": "user.deleted", **event}
+    await persist_user_event(revocation, db)
+    apply_user_event(revocation)
+    await publish_event("user.deleted", event)
 
     return {"message": "User deleted successfully"}
 
@@ -137,11 +306,16 @@ async def update_user_status(user_id: int, status: UserStatus, db: AsyncSession
     await db.commit()
     await db.refresh(user)
 
-    await publish_event("user.status_changed", {
+    event = {
         "user_id": user_id,
         "new_status": status.value,
-        "team_id": user.team_id
-    })
+        "team_id": user.team_id,
+        "changed_at": time.time()
+    }
+    revocation = {"event_type": "user.status_changed", **event}
+    await persist_user_event(revocation, db)
+    apply_user_event(revocation)
+    await publish_event("user.status_changed", event)
 
     return {"message": f"User status updated to {status.value}"}
 
@@ -165,3 +339,49 @@ async def assign_user_to_team(user_id: int, team_id: int, db: AsyncSession = Dep
     })
 
     return {"message": f"User assigned to team {team_id}"}
+
+
+@router.post("/users:bulkUpdateStatus", response_model=BulkUpdateOut)
+async def bulk_update_user_status(payload: BulkStatusUpdate, db: AsyncSession = Depends(get_db)):
+    query = update(User).values(status=payload.status)
+    if payload.user_ids:
+        query = query.where(User.id == any_(bindparam("ids", payload.user_ids, type_=ARRAY(Integer))))
+    if payload.department:
+        query = query.where(User.department == payload.department)
+
+    res = await db.execute(query.returning(User.id))
+    user_ids = list(res.scalars().all())
+    await db.commit()
+
+    if user_ids:
+        event = {
+            "user_ids": user_ids,
+            "new_status": payload.status.value,
+            "changed_at": time.time()
+        }
+        revocation = {"event_type": "users.status_changed_bulk", **event}
+        await persist_user_event(revocation, db)
+        apply_user_event(revocation)
+        await publish_event("users.status_changed_bulk", event)
+
+    return {"updated": len(user_ids), "user_ids": user_ids}
+
+
+@router.post("/users:bulkAssignTeam", response_model=BulkUpdateOut)
+async def bulk_assign_users_to_team(payload: BulkTeamAssign, db: AsyncSession = Depends(get_db)):
+    res = await db.execute(
+        update(User)
+        .where(User.id == any_(bindparam("ids", payload.user_ids, type_=ARRAY(Integer))))
+        .values(team_id=payload.team_id)
+        .returning(User.id)
+    )
+    user_ids = list(res.scalars().all())
+    await db.commit()
+
+    if user_ids:
+        await publish_event("users.team_assigned_bulk", {
+            "user_ids": user_ids,
+            "team_id": payload.team_id
+        })
+
+    return {"updated": len(user_ids), "user_ids": user_ids}
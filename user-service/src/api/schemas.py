@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, model_validator
+from typing import Optional, List, Dict
 from datetime import datetime
 from src.db.models import UserStatus, UserRole
+from src.config import BATCH_GET_MAX_IDS, BULK_UPDATE_MAX_IDS
 
 
 class UserCreate(BaseModel):
@@ -46,3 +47,64 @@ class Token(BaseModel):
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+
+class UserBatchOut(BaseModel):
+    items: List[UserOut]
+    missing: List[int]
+
+
+class UserImportRow(BaseModel):
+    email: EmailStr
+    password: str
+    name: Optional[str] = None
+    phone: Optional[str] = None
+    position: Optional[str] = None
+    department: Optional[str] = None
+
+
+class ImportRowResult(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: str
+    user_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class UserImportOut(BaseModel):
+    created: int
+    skipped: int
+    failed: int
+    results: List[ImportRowResult]
+
+
+class UserSearchOut(BaseModel):
+    items: List[UserOut]
+    next_cursor: Optional[str] = None
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+
+
+class BulkStatusUpdate(BaseModel):
+    status: UserStatus
+    user_ids: Optional[List[int]] = Field(None, max_length=BULK_UPDATE_MAX_IDS)
+    department: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_selector(self):
+        if not self.user_ids and not self.department:
+            raise ValueError("user_ids or department is required")
+        return self
+
+
+class BulkTeamAssign(BaseModel):
+    team_id: int
+    user_ids: List[int] = Field(..., min_length=1, max_length=BULK_UPDATE_MAX_IDS)
+
+
+class BulkUpdateOut(BaseModel):
+    updated: int
+    user_ids: List[int]
@@ -1,43 +1,208 @@
+import asyncio
+import base64
+import json
 import logging
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 import httpx
 from fastapi import HTTPException
 from jose import jwt
 from passlib.context import CryptContext
-from src.config import JWT_SECRET, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, settings
+from sqlalchemy import Float, and_, case, cast, func, literal, or_
+from src.config import (
+    JWT_SECRET, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_BATCH_SIZE, PASSWORD_HASH_BULK_WORKERS,
+    HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_HEDGE_DELAY, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, settings
+)
+from src.services.http_client import register_upstream, CircuitOpenError
+from src.services.invite_projection import lookup_invite, resolves_locally
+from src.db.models import User
 
 logger = logging.getLogger(__name__)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# min/max совпадают с default, чтобы хэши с другой стоимостью помечались на перехэширование
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 
-def hash_password(password: str) -> str:
+team_service = register_upstream(
+    "team-service",
+    settings.TEAM_SERVICE_URL,
+    timeout=HTTP_TIMEOUT,
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=CIRCUIT_RESET_TIMEOUT,
+    hedge_delay=HTTP_HEDGE_DELAY
+)
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_pending = 0
+_dummy_hash: Optional[str] = None
+
+
+def _hash_sync(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+def _hash_many_sync(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _verify_and_update_sync(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _hash_pool
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def _run_in_hash_pool(fn, *args):
+    """Выполнение bcrypt в пуле процессов с ограничением длины очереди"""
+    global _hash_pending
+    if _hash_pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, try again later",
+            headers={"Retry-After": "1"}
+        )
+
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_pool(), fn, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _run_in_hash_pool(_hash_sync, password)
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Пакетное хэширование мелкими задачами, не больше PASSWORD_HASH_BULK_WORKERS одновременно:
+    остальные воркеры пула свободны для login/register, и импорт не выстраивает перед ними очередь
+    """
+    if not passwords:
+        return []
+    chunks = [passwords[i:i + PASSWORD_HASH_BATCH_SIZE] for i in range(0, len(passwords), PASSWORD_HASH_BATCH_SIZE)]
+    slots = asyncio.Semaphore(PASSWORD_HASH_BULK_WORKERS)
+
+    async def run(chunk: List[str]) -> List[str]:
+        async with slots:
+            return await _run_in_hash_pool(_hash_many_sync, chunk)
+
+    results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+    return [hashed for chunk in results for hashed in chunk]
+
+
+async def init_password_hashing():
+    """
+    Запуск пула bcrypt и расчет хэша-заглушки при старте сервиса: первый вход
+    с неизвестным email не должен ждать лишний хэш, иначе время ответа выдает отсутствие пользователя
+    """
+    global _dummy_hash
+    _dummy_hash = await hash_password(uuid.uuid4().hex)
+
+
+def get_dummy_hash() -> str:
+    """Хэш для проверки при неизвестном email, чтобы время ответа не выдавало наличие пользователя"""
+    return _dummy_hash
+
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    valid, _ = await verify_and_update_password(plain, hashed)
+    return valid
+
+
+async def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Проверка пароля; второй элемент - новый хэш, если стоимость bcrypt изменилась"""
+    return await _run_in_hash_pool(_verify_and_update_sync, plain, hashed)
 
 
 def create_access_token(subject: str) -> str:
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"exp": expire, "sub": str(subject)}
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode = {"exp": expire, "iat": now, "sub": str(subject), "jti": uuid.uuid4().hex}
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
-async def validate_invite_code(code: str):
+async def redeem_invite_code(code: str):
+    """
+    Проверка приглашения при регистрации. Безлимитные коды разрешаются по локальной проекции
+    без сетевого запроса, счетчик использований team-service обновит по событию user.invite_redeemed.
+    Коды с лимитом и незнакомые проекции коды списываются в team-service -
+    только он атомарно проверяет лимит. POST не хеджируется - повтор списал бы лишнее использование
+    """
+    invite = lookup_invite(code)
+    if invite is not None and not invite["is_active"]:
+        return None
+    if invite is not None and resolves_locally(invite):
+        return {"team_id": invite["team_id"], "team_name": invite["team_name"], "redeemed_locally": True}
+
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.TEAM_SERVICE_URL}/api/team/invites/validate",
-                params={"code": code},
-                timeout=5.0
-            )
-            if response.status_code == 200:
-                return response.json()
-            return None
-    except (httpx.ConnectError, httpx.TimeoutException) as e:
+        response = await team_service.post("/api/team/invites/redeem", json={"code": code})
+        if response.status_code == 200:
+            return response.json()
+        return None
+    except (httpx.HTTPError, asyncio.TimeoutError, CircuitOpenError) as e:
         logger.error(f"Team service connection error: {e}")
         raise HTTPException(
             status_code=503,
             detail="Team service unavailable"
         )
+
+
+SEARCH_FIELDS = (User.name, User.email, User.department, User.position)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def user_search_clauses(q: str):
+    """Условие отбора и ранг: триграммное сходство по полям + бонус за совпадение префикса"""
+    prefix = _escape_like(q) + "%"
+    prefix_match = or_(*[field.ilike(prefix, escape="\\") for field in SEARCH_FIELDS])
+    condition = or_(prefix_match, *[field.op("%")(q) for field in SEARCH_FIELDS])
+    rank = cast(
+        func.greatest(*[func.similarity(field, q) for field in SEARCH_FIELDS]), Float
+    ) + case((prefix_match, literal(1.0)), else_=literal(0.0))
+    return condition, rank
+
+
+def keyset_after(rank, cursor: str):
+    """Условие "после курсора" для сортировки (rank DESC, id ASC)"""
+    last_rank, last_id = decode_cursor(cursor, 2)
+    return or_(rank < last_rank, and_(rank == last_rank, User.id > last_id))
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
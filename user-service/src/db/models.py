@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, Index
 from sqlalchemy.sql import func
 from src.db.database import Base
 import enum
@@ -30,4 +30,37 @@ class User(Base):
     position = Column(String, nullable=True)
     department = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_users_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+        Index("ix_users_department_trgm", "department", postgresql_using="gin",
+              postgresql_ops={"department": "gin_trgm_ops"}),
+        Index("ix_users_position_trgm", "position", postgresql_using="gin",
+              postgresql_ops={"position": "gin_trgm_ops"}),
+    )
+
+
+class TeamInvite(Base):
+    __tablename__ = "team_invites"
+
+    invite_code = Column(String, primary_key=True)
+    team_id = Column(Integer, index=True, nullable=False)
+    team_name = Column(String, nullable=True)
+    is_active = Column(Boolean, default=True)
+    max_uses = Column(Integer, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class TokenRevocation(Base):
+    """Отзыв токенов для восстановления списка отзыва после рестарта; jti пустой - отозваны все токены user_id"""
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=True)
+    jti = Column(String, nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -1,11 +1,14 @@
 import asyncio
 from fastapi import FastAPI
 from src.api.endpoints import router
+from src.api.utils import init_password_hashing, shutdown_hash_pool
 from src.db.database import engine
 from src.db.models import User
 from sqladmin import Admin, ModelView
 
-from src.services.event_consumers import setup_user_consumers
+from src.services.event_consumers import setup_user_consumers, setup_invite_projection
+from src.services.http_client import close_upstreams
+from src.services.revocation_store import sync_revocations
 
 
 app = FastAPI(title="User Service", version="1.0.0")
@@ -15,9 +18,18 @@ admin = Admin(app, engine)
 
 @app.on_event("startup")
 async def startup_event():
+    await init_password_hashing()
+    asyncio.create_task(sync_revocations())
+    asyncio.create_task(setup_invite_projection())
     asyncio.create_task(setup_user_consumers())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_hash_pool()
+    await close_upstreams()
+
+
 class UserAdmin(ModelView, model=User):
     column_list = [
         User.id, User.email, User.name, User.hashed_password, User.role, User.status,
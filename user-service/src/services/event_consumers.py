@@ -1,7 +1,12 @@
-from functools import partial
+import asyncio
 from sqlalchemy import update
-from src.services.rabbitmq import consume_events
-from src.db.database import get_db
+from src.services.rabbitmq import consume_events, INSTANCE_ID
+from src.services.auth import apply_user_event
+from src.services.invite_projection import (
+    upsert_invite, rename_team_invites, deactivate_invites, deactivate_invite_code, bootstrap_invites
+)
+from src.api.utils import team_service
+from src.db.database import AsyncSessionLocal
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.db.models import User
 import logging
@@ -9,7 +14,17 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-async def handle_team_events(data: dict, db: AsyncSession):
+async def handle_team_events(data: dict):
+    """Своя сессия на каждое сообщение: ошибка откатывает только его транзакцию"""
+    async with AsyncSessionLocal() as db:
+        try:
+            await _apply_team_event(data, db)
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def _apply_team_event(data: dict, db: AsyncSession):
     event_type = data.get("event_type")
     if event_type == "team.user_assigned":
         user_id = data["user_id"]
@@ -22,11 +37,62 @@ async def handle_team_events(data: dict, db: AsyncSession):
         await db.commit()
         logger.info(f"User {user_id} assigned to team {team_id}")
 
+    elif event_type in ("team.created", "team.updated"):
+        if event_type == "team.updated":
+            await rename_team_invites(db, data["team_id"], data.get("name"))
+        # Основной код команды безлимитный и без срока действия
+        await upsert_invite(
+            db,
+            data["team_id"],
+            data.get("invite_code"),
+            data.get("name"),
+            data.get("is_active", True)
+        )
+        logger.info(f"Invite projection updated for team {data['team_id']}")
+
+    elif event_type == "team.invite_created":
+        await upsert_invite(
+            db,
+            data["team_id"],
+            data.get("invite_code"),
+            data.get("team_name"),
+            max_uses=data.get("max_uses"),
+            expires_at=data.get("expires_at")
+        )
+
+    elif event_type == "team.deactivated":
+        await deactivate_invites(db, data["team_id"])
+        logger.info(f"Invite projection deactivated for team {data['team_id']}")
+
+    elif event_type == "team.invite_revoked":
+        await deactivate_invite_code(db, data.get("invite_code"))
+
+
+async def setup_invite_projection():
+    async with AsyncSessionLocal() as db:
+        try:
+            await bootstrap_invites(db, team_service)
+        except Exception as e:
+            logger.error(f"Invite projection bootstrap failed: {e}")
+
+
+async def handle_own_user_events(data: dict):
+    """Отзыв, примененный другим экземпляром; в token_revocations его уже записал источник"""
+    apply_user_event(data)
+
 
 async def setup_user_consumers():
+    # Очередь на каждый экземпляр: отзыв должен дойти до всех реплик user-service
+    asyncio.create_task(consume_events(
+        queue_name=f"user_revocations_{INSTANCE_ID}",
+        exchange_name="user_events",
+        routing_keys=["user.status_changed", "user.deleted", "user.token_revoked", "users.status_changed_bulk"],
+        callback=handle_own_user_events,
+        durable=False
+    ))
     await consume_events(
         queue_name="user_service_queue",
         exchange_name="team_events",
         routing_keys=["team.*"],
-        callback=partial(handle_team_events, db=await get_db().__anext__())
+        callback=handle_team_events
     )
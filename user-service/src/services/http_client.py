@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold ошибок подряд, через reset_timeout пропускает пробный запрос"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.half_open = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.half_open:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self.half_open and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.half_open = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.half_open = False
+
+    def release_probe(self):
+        """Пробный запрос отменен без результата: следующий вызов сможет проверить сервис снова"""
+        self.half_open = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.half_open or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.half_open = False
+
+
+class UpstreamClient:
+    def __init__(
+            self,
+            name: str,
+            base_url: str,
+            timeout: float = 5.0,
+            max_connections: int = 100,
+            max_keepalive_connections: int = 20,
+            keepalive_expiry: float = 30.0,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0,
+            hedge_delay: Optional[float] = None
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "rejected": 0,
+            "hedged": 0,
+            "latency_ms_total": 0.0
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+        return self._client
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        response = await self.client.request(method, url, **kwargs)
+        if response.status_code >= 500:
+            raise httpx.HTTPStatusError(
+                f"{self.name} responded with {response.status_code}",
+                request=response.request,
+                response=response
+            )
+        return response
+
+    async def _send_hedged(self, url: str, hedge_delay: float, **kwargs) -> httpx.Response:
+        first = asyncio.create_task(self._send("GET", url, **kwargs))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+            if done:
+                return first.result()
+
+            self.stats["hedged"] += 1
+            tasks.append(asyncio.create_task(self._send("GET", url, **kwargs)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # В том числе при отмене вызывающего: незавершенные запросы не остаются висеть
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def request(
+            self,
+            method: str,
+            url: str,
+            timeout: Optional[float] = None,
+            hedge: bool = False,
+            **kwargs
+    ) -> httpx.Response:
+        """
+        Запрос к сервису с общим дедлайном; hedge допустим только для идемпотентных GET.
+        Свой timeout передается и в httpx, иначе клиент оборвет запрос по таймауту по умолчанию
+        """
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        deadline = timeout or self.timeout
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout)
+        self.stats["requests"] += 1
+        started = time.monotonic()
+        # Исход фиксируется всегда: иначе пробный запрос в half_open оставил бы цепь разомкнутой навсегда
+        try:
+            if hedge and method == "GET" and self.hedge_delay:
+                call = self._send_hedged(url, self.hedge_delay, **kwargs)
+            else:
+                call = self._send(method, url, **kwargs)
+            response = await asyncio.wait_for(call, timeout=deadline)
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.stats["latency_ms_total"] += (time.monotonic() - started) * 1000
+
+        self.breaker.record_success()
+        return response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def metrics(self) -> dict:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "avg_latency_ms": round(self.stats["latency_ms_total"] / requests, 2) if requests else 0.0,
+            "circuit": self.breaker.state
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_upstreams: Dict[str, UpstreamClient] = {}
+
+
+def register_upstream(name: str, base_url: str, **options) -> UpstreamClient:
+    upstream = UpstreamClient(name, base_url, **options)
+    _upstreams[name] = upstream
+    return upstream
+
+
+def get_upstream(name: str) -> UpstreamClient:
+    return _upstreams[name]
+
+
+def upstream_metrics() -> dict:
+    return {name: upstream.metrics() for name, upstream in _upstreams.items()}
+
+
+async def close_upstreams():
+    for upstream in _upstreams.values():
+        await upstream.aclose()
@@ -0,0 +1,150 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.models import TeamInvite
+
+logger = logging.getLogger(__name__)
+
+# invite_code -> {"team_id", "team_name", "is_active", "max_uses", "expires_at"}; зеркало таблицы team_invites
+_invites: Dict[str, dict] = {}
+
+
+def lookup_invite(code: str) -> Optional[dict]:
+    return _invites.get(code)
+
+
+def resolves_locally(invite: dict) -> bool:
+    """Безлимитный код проверяется по проекции; лимит использований списывает только team-service"""
+    if not invite["is_active"] or invite["max_uses"] is not None:
+        return False
+    return invite["expires_at"] is None or invite["expires_at"] > datetime.now(timezone.utc)
+
+
+def _parse_expires_at(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    expires_at = datetime.fromisoformat(value)
+    return expires_at if expires_at.tzinfo else expires_at.replace(tzinfo=timezone.utc)
+
+
+def _remember(row: dict):
+    _invites[row["invite_code"]] = {
+        "team_id": row["team_id"],
+        "team_name": row.get("team_name"),
+        "is_active": row.get("is_active", True),
+        "max_uses": row.get("max_uses"),
+        "expires_at": row.get("expires_at")
+    }
+
+
+async def load_invites(db: AsyncSession) -> int:
+    res = await db.execute(select(TeamInvite))
+    invites = res.scalars().all()
+    _invites.clear()
+    for invite in invites:
+        _remember({
+            "invite_code": invite.invite_code,
+            "team_id": invite.team_id,
+            "team_name": invite.team_name,
+            "is_active": invite.is_active,
+            "max_uses": invite.max_uses,
+            "expires_at": invite.expires_at
+        })
+    return len(invites)
+
+
+def _upsert_statement(rows: list):
+    stmt = insert(TeamInvite).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[TeamInvite.invite_code],
+        set_={
+            "team_id": stmt.excluded.team_id,
+            "team_name": stmt.excluded.team_name,
+            "is_active": stmt.excluded.is_active,
+            "max_uses": stmt.excluded.max_uses,
+            "expires_at": stmt.excluded.expires_at,
+            "updated_at": func.now()
+        }
+    )
+
+
+async def upsert_invite(db: AsyncSession, team_id: int, invite_code: Optional[str], team_name: Optional[str] = None,
+                        is_active: bool = True, max_uses: Optional[int] = None, expires_at=None):
+    if not invite_code:
+        return
+
+    row = {
+        "team_id": team_id,
+        "invite_code": invite_code,
+        "team_name": team_name,
+        "is_active": is_active,
+        "max_uses": max_uses,
+        "expires_at": _parse_expires_at(expires_at)
+    }
+    await db.execute(_upsert_statement([row]))
+    await db.commit()
+    _remember(row)
+
+
+async def rename_team_invites(db: AsyncSession, team_id: int, team_name: Optional[str]):
+    await db.execute(
+        update(TeamInvite).where(TeamInvite.team_id == team_id).values(team_name=team_name)
+    )
+    await db.commit()
+    for invite in _invites.values():
+        if invite["team_id"] == team_id:
+            invite["team_name"] = team_name
+
+
+async def deactivate_invites(db: AsyncSession, team_id: int):
+    await db.execute(
+        update(TeamInvite).where(TeamInvite.team_id == team_id).values(is_active=False)
+    )
+    await db.commit()
+    for invite in _invites.values():
+        if invite["team_id"] == team_id:
+            invite["is_active"] = False
+
+
+async def deactivate_invite_code(db: AsyncSession, invite_code: Optional[str]):
+    if not invite_code:
+        return
+    await db.execute(
+        update(TeamInvite).where(TeamInvite.invite_code == invite_code).values(is_active=False)
+    )
+    await db.commit()
+    if invite_code in _invites:
+        _invites[invite_code]["is_active"] = False
+
+
+async def bootstrap_invites(db: AsyncSession, team_service):
+    """
+    Первичное заполнение проекции из team-service, если таблица пуста.
+    Берутся только основные коды команд; остальные придут событиями team.invite_created,
+    а незнакомый проекции код проверяется в team-service
+    """
+    if await load_invites(db):
+        return
+
+    response = await team_service.get("/api/teams", timeout=30.0)
+    response.raise_for_status()
+    rows = [
+        {
+            "team_id": team["id"],
+            "invite_code": team["invite_code"],
+            "team_name": team.get("name"),
+            "is_active": team.get("is_active", True),
+            "max_uses": None,
+            "expires_at": None
+        }
+        for team in response.json() if team.get("invite_code")
+    ]
+    if rows:
+        await db.execute(_upsert_statement(rows))
+        await db.commit()
+        for row in rows:
+            _remember(row)
+    logger.info(f"Bootstrapped {len(_invites)} team invites from team service")
@@ -3,18 +3,28 @@ import json
 import asyncio
 from src.config import RABBITMQ_URL
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
+EXCHANGE_NAME = "user_events"
+# Идентификатор процесса для очередей, которые нужны каждому экземпляру
+INSTANCE_ID = uuid.uuid4().hex[:12]
+
 
 async def publish_event(routing_key: str, body: dict):
     try:
         connection = await aio_pika.connect_robust(RABBITMQ_URL)
         async with connection:
             channel = await connection.channel()
-            await channel.default_exchange.publish(
+            exchange = await channel.declare_exchange(
+                EXCHANGE_NAME,
+                aio_pika.ExchangeType.TOPIC,
+                durable=True
+            )
+            await exchange.publish(
                 aio_pika.Message(
-                    body=json.dumps(body).encode(),
+                    body=json.dumps({"event_type": routing_key, **body}).encode(),
                     delivery_mode=aio_pika.DeliveryMode.PERSISTENT
                 ),
                 routing_key=routing_key
@@ -23,7 +33,8 @@ async def publish_event(routing_key: str, body: dict):
         logger.error(f"Failed to publish event: {e}")
 
 
-async def consume_events(queue_name: str, exchange_name: str, routing_keys: list, callback):
+async def consume_events(queue_name: str, exchange_name: str, routing_keys: list, callback,
+                         durable: bool = True):
     try:
         connection = await aio_pika.connect_robust(RABBITMQ_URL)
         async with connection:
@@ -36,7 +47,8 @@ async def consume_events(queue_name: str, exchange_name: str, routing_keys: list
 
             queue = await channel.declare_queue(
                 queue_name,
-                durable=True,
+                durable=durable,
+                auto_delete=not durable,
                 arguments={
                     'x-message-ttl': 86400000,
                     'x-max-length': 10000
@@ -58,4 +70,4 @@ async def consume_events(queue_name: str, exchange_name: str, routing_keys: list
     except Exception as e:
         logger.error(f"Consumer error: {e}")
         await asyncio.sleep(5)
-        asyncio.create_task(consume_events(queue_name, exchange_name, routing_keys, callback))
+        asyncio.create_task(consume_events(queue_name, exchange_name, routing_keys, callback, durable))
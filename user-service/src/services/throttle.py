@@ -0,0 +1,89 @@
+import hashlib
+import time
+from array import array
+from typing import Optional
+from fastapi import HTTPException
+from src.config import LOGIN_EMAIL_LIMIT, LOGIN_EMAIL_WINDOW, LOGIN_IP_LIMIT, LOGIN_IP_WINDOW
+
+
+class SlidingWindowCounter:
+    """
+    Count-min sketch поверх кольца временных корзин.
+    Обновление и проверка - O(depth * buckets), память фиксирована и не зависит от числа ключей
+    """
+
+    def __init__(self, limit: int, window_seconds: float, buckets: int = 6, width: int = 2048, depth: int = 4):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.bucket_seconds = window_seconds / buckets
+        self.buckets = buckets
+        self.width = width
+        self.depth = depth
+        self.counts = array("I", bytes(4 * depth * width * buckets))
+        self._zero_slot = array("I", bytes(4 * depth * width))
+        self.bucket_epochs = [-1] * buckets
+        self.checked = 0
+        self.rejected = 0
+
+    def _cells(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        for row in range(self.depth):
+            column = int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width
+            yield (row * self.width + column) * self.buckets
+
+    def _advance(self, now: float) -> int:
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % self.buckets
+        if self.bucket_epochs[slot] != epoch:
+            self.counts[slot::self.buckets] = self._zero_slot
+            self.bucket_epochs[slot] = epoch
+        return epoch
+
+    def hit(self, key: str, now: Optional[float] = None) -> bool:
+        """Учитывает попытку; False, если лимит окна уже исчерпан"""
+        epoch = self._advance(now or time.monotonic())
+        live_slots = [b for b, e in enumerate(self.bucket_epochs) if e > epoch - self.buckets]
+        slot = epoch % self.buckets
+        cells = list(self._cells(key))
+
+        self.checked += 1
+        estimate = min(sum(self.counts[cell + b] for b in live_slots) for cell in cells)
+        if estimate >= self.limit:
+            self.rejected += 1
+            return False
+
+        for cell in cells:
+            self.counts[cell + slot] += 1
+        return True
+
+    def metrics(self) -> dict:
+        return {
+            "limit": self.limit,
+            "window_seconds": self.window_seconds,
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "memory_bytes": self.counts.itemsize * len(self.counts)
+        }
+
+
+email_limiter = SlidingWindowCounter(LOGIN_EMAIL_LIMIT, LOGIN_EMAIL_WINDOW)
+ip_limiter = SlidingWindowCounter(LOGIN_IP_LIMIT, LOGIN_IP_WINDOW)
+
+
+def check_login_allowed(email: str, client_ip: Optional[str]):
+    if client_ip and not ip_limiter.hit(client_ip):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(int(ip_limiter.bucket_seconds))}
+        )
+    if not email_limiter.hit(email.lower()):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(int(email_limiter.bucket_seconds))}
+        )
+
+
+def throttle_metrics() -> dict:
+    return {"email": email_limiter.metrics(), "ip": ip_limiter.metrics()}
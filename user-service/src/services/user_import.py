@@ -0,0 +1,165 @@
+"""
+Массовый импорт пользователей: CSV или NDJSON -> COPY во временную таблицу -> INSERT ... ON CONFLICT (email)
+
+CLI: python -m src.services.user_import users.csv [--team-id 1]
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+from typing import List, Optional
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.api.schemas import UserImportRow, ImportRowResult, UserImportOut
+from src.api.utils import hash_passwords, shutdown_hash_pool
+from src.config import USER_IMPORT_MAX_ROWS
+from src.db.database import AsyncSessionLocal
+from src.services.rabbitmq import publish_event
+
+logger = logging.getLogger(__name__)
+
+STAGING_COLUMNS = ["row_num", "email", "name", "hashed_password", "phone", "position", "department"]
+
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE users_import (
+    row_num integer,
+    email varchar,
+    name varchar,
+    hashed_password varchar,
+    phone varchar,
+    position varchar,
+    department varchar
+) ON COMMIT DROP
+"""
+
+MERGE_SQL = """
+INSERT INTO users (email, name, hashed_password, role, status, team_id, phone, position, department)
+SELECT email, name, hashed_password, 'USER'::userrole, CAST(:status AS userstatus), CAST(:team_id AS integer),
+       phone, position, department
+FROM users_import
+ORDER BY row_num
+ON CONFLICT (email) DO NOTHING
+RETURNING id, email
+"""
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def parse_import_payload(payload: str, fmt: str) -> List[dict]:
+    if fmt == "csv":
+        return [dict(row) for row in csv.DictReader(io.StringIO(payload))]
+    if fmt == "ndjson":
+        rows = []
+        for line_num, line in enumerate(payload.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ImportFormatError(f"Invalid JSON on line {line_num}: {e.msg}")
+        return rows
+    raise ImportFormatError(f"Unsupported import format: {fmt}")
+
+
+async def import_users(raw_rows: List[dict], db: AsyncSession, team_id: Optional[int] = None) -> UserImportOut:
+    if len(raw_rows) > USER_IMPORT_MAX_ROWS:
+        raise ImportFormatError(f"Too many rows, limit is {USER_IMPORT_MAX_ROWS}")
+
+    results = {}
+    valid: List[tuple] = []
+    seen_emails = set()
+
+    for row_num, raw in enumerate(raw_rows, start=1):
+        try:
+            row = UserImportRow.model_validate(raw)
+        except ValidationError as e:
+            results[row_num] = ImportRowResult(
+                row=row_num,
+                email=raw.get("email") if isinstance(raw, dict) else None,
+                status="error",
+                error=e.errors()[0]["msg"]
+            )
+            continue
+
+        email = row.email
+        if email in seen_emails:
+            results[row_num] = ImportRowResult(row=row_num, email=email, status="error",
+                                               error="Duplicate email in import")
+            continue
+        seen_emails.add(email)
+        valid.append((row_num, email, row))
+
+    created_ids = {}
+    if valid:
+        hashed = await hash_passwords([row.password for _, _, row in valid])
+        records = [
+            (row_num, email, row.name, hashed_password, row.phone, row.position, row.department)
+            for (row_num, email, row), hashed_password in zip(valid, hashed)
+        ]
+
+        conn = await db.connection()
+        raw_conn = await conn.get_raw_connection()
+        await conn.execute(text(CREATE_STAGING_SQL))
+        await raw_conn.driver_connection.copy_records_to_table(
+            "users_import", records=records, columns=STAGING_COLUMNS
+        )
+        merged = await conn.execute(
+            text(MERGE_SQL),
+            {"status": "ACTIVE" if team_id else "PENDING", "team_id": team_id}
+        )
+        created_ids = {email: user_id for user_id, email in merged.all()}
+        await db.commit()
+
+    for row_num, email, _ in valid:
+        if email in created_ids:
+            results[row_num] = ImportRowResult(row=row_num, email=email, status="created",
+                                               user_id=created_ids[email])
+        else:
+            results[row_num] = ImportRowResult(row=row_num, email=email, status="skipped",
+                                               error="Email already registered")
+
+    if created_ids:
+        await publish_event("users.imported", {
+            "user_ids": list(created_ids.values()),
+            "team_id": team_id,
+            "count": len(created_ids)
+        })
+
+    ordered = [results[row_num] for row_num in sorted(results)]
+    return UserImportOut(
+        created=sum(1 for r in ordered if r.status == "created"),
+        skipped=sum(1 for r in ordered if r.status == "skipped"),
+        failed=sum(1 for r in ordered if r.status == "error"),
+        results=ordered
+    )
+
+
+async def _main(path: str, fmt: Optional[str], team_id: Optional[int]):
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    with open(path, encoding="utf-8") as f:
+        raw_rows = parse_import_payload(f.read(), fmt)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            summary = await import_users(raw_rows, db, team_id)
+    finally:
+        shutdown_hash_pool()
+
+    for result in summary.results:
+        if result.status != "created":
+            print(f"row {result.row} {result.email}: {result.status} ({result.error})")
+    print(f"created={summary.created} skipped={summary.skipped} failed={summary.failed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or NDJSON")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    parser.add_argument("--team-id", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(_main(args.path, args.format, args.team_id))
@@ -0,0 +1,44 @@
+"""
+Тесты идут против настоящего Postgres. База задается TEST_DB_NAME (остальные DB_* - как у сервиса),
+мигрируется alembic до head и очищается перед каждым тестом. Без TEST_DB_NAME тесты пропускаются
+"""
+import os
+from pathlib import Path
+import pytest
+
+if os.getenv("TEST_DB_NAME"):
+    os.environ["DB_NAME"] = os.environ["TEST_DB_NAME"]
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+TABLES = ("users", "team_invites", "token_revocations")
+
+
+@pytest.fixture(scope="session")
+def migrated_db():
+    if not os.getenv("TEST_DB_NAME"):
+        pytest.skip("TEST_DB_NAME is not set")
+    from alembic import command
+    from alembic.config import Config
+    command.upgrade(Config(str(SERVICE_ROOT / "alembic.ini")), "head")
+
+
+@pytest.fixture
+async def db(migrated_db):
+    from sqlalchemy import text
+    from src.db.database import AsyncSessionLocal, engine
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY"))
+        await session.commit()
+        yield session
+    # Соединения пула привязаны к циклу событий теста
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(db):
+    import httpx
+    from src.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
@@ -0,0 +1,87 @@
+"""
+Замеры производительности; запускаются только с RUN_BENCHMARKS=1, результаты печатаются:
+RUN_BENCHMARKS=1 python -m pytest -q -s tests/test_benchmarks.py
+"""
+import asyncio
+import os
+import statistics
+import time
+import pytest
+from sqlalchemy import select, text
+from src.api.utils import hash_password, pwd_context, shutdown_hash_pool, user_search_clauses
+from src.config import PASSWORD_HASH_WORKERS
+from src.db.models import User
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="RUN_BENCHMARKS is not set")
+
+HASHES = 32
+USERS = 1_000_000
+SEARCH_RUNS = 5
+SEARCH_QUERIES = ("user12345", "Platform", "engineer")
+USERS_SEED = (
+    f"""
+    INSERT INTO users (email, name, hashed_password, role, status, department, position)
+    SELECT 'user' || g || '@example.com', 'User' || g || ' ' || md5(g::text), 'x', 'USER',
+           (ARRAY['ACTIVE', 'PENDING', 'SUSPENDED'])[g % 3 + 1]::userstatus,
+           (ARRAY['Platform', 'Sales', 'Support', 'Finance', 'Marketing'])[g % 5 + 1],
+           (ARRAY['Engineer', 'Manager', 'Analyst', 'Designer'])[g % 4 + 1] || ' ' || g % 97
+    FROM generate_series(1, {USERS}) g
+    """,
+    "ANALYZE users",
+)
+
+
+async def _max_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Наибольшая задержка тика цикла событий, пока идет замер"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def test_password_hashing_throughput():
+    started = time.perf_counter()
+    pwd_context.hash("warm-up")
+    inline = time.perf_counter() - started
+
+    await hash_password("warm-up")
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_max_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(hash_password(f"password-{i}") for i in range(HASHES)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lag = await ticker
+    shutdown_hash_pool()
+
+    print(f"\nbcrypt: inline {inline * 1000:.0f} ms/hash; pool of {PASSWORD_HASH_WORKERS}: "
+          f"{HASHES / elapsed:.1f} hashes/s, max event loop lag {lag * 1000:.0f} ms")
+    # Хэширование в пуле не блокирует цикл событий на время хэша
+    assert lag < inline
+
+
+async def test_user_search_on_a_million_users(client, db):
+    if not await db.scalar(text("SELECT count(*) FROM pg_extension WHERE extname = 'pg_trgm'")):
+        pytest.skip("pg_trgm is not installed")
+    for statement in USERS_SEED:
+        await db.execute(text(statement))
+    await db.commit()
+
+    for q in SEARCH_QUERIES:
+        condition, _ = user_search_clauses(q)
+        query = select(User.id).where(condition)
+        sql = query.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+        plan = "\n".join((await db.execute(text(f"EXPLAIN {sql}"))).scalars().all())
+        assert "_trgm" in plan, plan
+
+        for facets in (False, True):
+            timings = []
+            for _ in range(SEARCH_RUNS):
+                started = time.perf_counter()
+                response = await client.get("/api/users/search", params={"q": q, "facets": facets})
+                timings.append(time.perf_counter() - started)
+                assert response.status_code == 200
+            print(f"\nsearch {q!r} over {USERS} users, facets={facets}: "
+                  f"median {statistics.median(timings) * 1000:.0f} ms")
@@ -0,0 +1,30 @@
+import asyncio
+from sqlalchemy import select, func
+from src.db.models import User
+
+PAYLOAD = {"email": "duplicate@example.com", "password": "correct horse", "name": "Duplicate"}
+
+
+async def test_duplicate_signup_returns_400(client):
+    first = await client.post("/api/register", json=PAYLOAD)
+    second = await client.post("/api/register", json=PAYLOAD)
+
+    assert first.status_code == 200
+    assert second.status_code == 400
+
+
+async def test_concurrent_duplicate_signups_create_one_user(client, db):
+    responses = await asyncio.gather(*(client.post("/api/register", json=PAYLOAD) for _ in range(8)))
+
+    assert sorted(r.status_code for r in responses) == [200] + [400] * 7
+    count = await db.scalar(select(func.count()).select_from(User).where(User.email == PAYLOAD["email"]))
+    assert count == 1
+
+
+async def test_signup_with_unreachable_team_service_returns_503_and_keeps_no_user(client, db):
+    payload = {**PAYLOAD, "email": "invited@example.com", "invite_code": "unknown-code"}
+    response = await client.post("/api/register", json=payload)
+
+    assert response.status_code == 503
+    count = await db.scalar(select(func.count()).select_from(User).where(User.email == payload["email"]))
+    assert count == 0